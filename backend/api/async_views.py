@@ -0,0 +1,104 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import OperationalError, close_old_connections
+from django.http import HttpResponse
+from django.urls import URLPattern
+
+from foodgram.routers import retry_on_primary
+
+ASYNC_READ_ROUTES = {
+    'tags-list', 'tags-detail',
+    'ingredients-list', 'ingredients-detail',
+    'recipes-list', 'recipes-detail',
+    'recipes-download-shopping-cart', 'recipes-feed',
+    'recipes-similar', 'recipes-recommended', 'recipes-pantry',
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_READ_THREADS,
+    thread_name_prefix='async-read',
+)
+
+
+def materialize(response):
+    """Собирает потоковый ответ в обычный.
+
+    ASGI-обработчик Django читает потоковый ответ в цикле событий, где
+    запросы к базе данных запрещены, поэтому содержимое собирается
+    в том же потоке, где выполнялось представление.
+    """
+    content = HttpResponse(
+        b''.join(response.streaming_content), status=response.status_code
+    )
+    for header, value in response.items():
+        content[header] = value
+    response.close()
+    return content
+
+
+def render_view(view, request, args, kwargs):
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response = response.render()
+    if response.streaming:
+        response = materialize(response)
+    return response
+
+
+def call_view(view, request, args, kwargs):
+    """Выполняет синхронное представление и рендерит ответ.
+
+    Если чтение с реплики завершилось ошибкой соединения, представление
+    выполняется ещё раз с чтением из основной базы.
+    """
+    close_old_connections()
+    stats = getattr(request, 'query_stats', None)
+    try:
+        with stats.track() if stats is not None else nullcontext():
+            try:
+                return render_view(view, request, args, kwargs)
+            except OperationalError as error:
+                if not retry_on_primary(error):
+                    raise
+                return render_view(view, request, args, kwargs)
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Асинхронная обёртка над DRF-представлением.
+
+    GET и HEAD выполняются в пуле из ASYNC_READ_THREADS потоков, поэтому
+    цикл событий продолжает обслуживать других клиентов, пока идут
+    запросы к базе и отправка ответа. Остальные методы выполняются
+    в общем потоке для синхронного кода, как обычные представления.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in {'GET', 'HEAD'}:
+            return await sync_to_async(call_view)(view, request, args, kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(
+            contextvars.copy_context().run,
+            call_view, view, request, args, kwargs,
+        ))
+
+    return wrapper
+
+
+def async_read_urls(patterns):
+    """Заменяет представления маршрутов чтения асинхронными обёртками."""
+    return [
+        URLPattern(
+            pattern.pattern, async_view(pattern.callback),
+            pattern.default_args, pattern.name,
+        ) if pattern.name in ASYNC_READ_ROUTES else pattern
+        for pattern in patterns
+    ]
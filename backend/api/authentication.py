@@ -0,0 +1,99 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """Ограниченный по размеру LRU-кеш с временем жизни записей."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+tokens = TokenCache(
+    settings.TOKEN_AUTH_CACHE_SIZE, settings.TOKEN_AUTH_CACHE_TTL
+)
+
+
+def get_shared_cache():
+    if settings.TOKEN_AUTH_SHARED_CACHE is None:
+        return None
+    return caches[settings.TOKEN_AUTH_SHARED_CACHE]
+
+
+def shared_key(key):
+    return f'auth-token:{sha256(key.encode()).hexdigest()}'
+
+
+def forget_token(key):
+    """Удаляет токен из кеша процесса и общего кеша."""
+    tokens.delete(key)
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.delete(shared_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену без запроса к базе на каждый вызов.
+
+    Токены с пользователями хранятся в LRU-кеше процесса на
+    TOKEN_AUTH_CACHE_TTL секунд, а при заданном TOKEN_AUTH_SHARED_CACHE —
+    ещё и в общем кеше. Сигналы удаляют токен из кешей при его удалении
+    и при сохранении пользователя; кеши других процессов устаревают
+    не дольше чем на TOKEN_AUTH_CACHE_TTL секунд.
+    """
+
+    def authenticate_credentials(self, key):
+        token = tokens.get(key)
+        if token is None:
+            shared = get_shared_cache()
+            if shared is not None:
+                token = shared.get(shared_key(key))
+            if token is None:
+                _, token = super().authenticate_credentials(key)
+                if shared is not None:
+                    shared.set(
+                        shared_key(key), token,
+                        settings.TOKEN_AUTH_CACHE_TTL,
+                    )
+            tokens.set(key, token)
+        token = copy.deepcopy(token)
+        return token.user, token
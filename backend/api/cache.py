@@ -0,0 +1,73 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+
+from recipes.versions import get_cache, get_data_version
+
+from .renderers import ORJSONRenderer
+
+
+class VersionedCacheMixin:
+    """Кеширует готовый JSON ответов list/retrieve справочных данных.
+
+    Ключ кеша и ETag содержат версию данных из DataVersion, которую
+    сигналы моделей меняют при каждом изменении. Last-Modified
+    не отправляется: у HTTP-даты точность в секунду, и по If-Modified-Since
+    клиент не увидел бы второго изменения в ту же секунду. Устаревшие
+    ответы не удаляются явно, а просто перестают запрашиваться.
+    """
+    cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, self.build_list, *args, **kwargs
+        )
+
+    def build_list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def cached_response(self, request, view, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return view(request, *args, **kwargs)
+        version = get_data_version(self.cache_name)
+        path = md5(request.get_full_path().encode()).hexdigest()
+        etag = quote_etag(f'{self.cache_name}-{version}-{path}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            cache = get_cache()
+            key = f'data:{self.cache_name}:{version}:{path}'
+            content = cache.get(key)
+            if content is None:
+                result = view(request, *args, **kwargs)
+                if result.status_code != 200:
+                    return result
+                content = ORJSONRenderer().render(result.data)
+                cache.set(
+                    key, content, settings.REFERENCE_DATA_CACHE_TIMEOUT
+                )
+            response = HttpResponse(
+                content, content_type='application/json'
+            )
+        response['ETag'] = etag
+        return response
+
+
+def recipe_cache_keys(rows, url_base):
+    """Ключи кеша представлений рецептов: {ключ: id рецепта}.
+
+    Ключ содержит время изменения рецепта из строки read_values(),
+    которое сигналы обновляют при изменении рецепта, его ингредиентов,
+    тегов и автора, и адрес сайта из ссылок на фото.
+    """
+    prefix = 'recipe:{}'.format(md5(url_base.encode()).hexdigest())
+    return {
+        f'{prefix}:{row["id"]}:{row["updated"].timestamp()}': row['id']
+        for row in rows
+    }
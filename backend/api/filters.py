@@ -1,9 +1,23 @@
 from django_filters import rest_framework as filters
+from django_filters.constants import EMPTY_VALUES
 from rest_framework.filters import SearchFilter
 
 from recipes.models import Ingredient, Recipe, Tag
 
 
+class StableOrderingFilter(filters.OrderingFilter):
+    """Сортировка с добавлением id, чтобы порядок страниц был устойчивым
+    при равных значениях."""
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        return qs.order_by(
+            *ordering, '-id' if ordering[-1].startswith('-') else 'id'
+        )
+
+
 class RecipeFilter(filters.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
@@ -14,10 +28,19 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = StableOrderingFilter(
+        fields=('pub_date', 'favorites_count', 'in_carts_count')
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart', )
+        fields = (
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search',
+        )
+
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -0,0 +1,162 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.urls import resolve
+
+logger = logging.getLogger('api.stats')
+
+
+class QueryStats:
+    """Считает запросы к базе данных и время их выполнения в блоке with."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.total_time = 0.0
+        self._stack = None
+        self._started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    @contextmanager
+    def track(self):
+        """Подключает подсчёт к соединениям текущего потока."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        self._stack.enter_context(self.track())
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.total_time = time.perf_counter() - self._started
+        self._stack.close()
+
+
+def get_view_action(request):
+    match = getattr(request, 'resolver_match', None) or resolve(
+        request.path_info
+    )
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name, None, None
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}', view_class, action
+
+
+def get_query_budget(view_class, action):
+    return getattr(view_class, 'query_budgets', {}).get(action)
+
+
+class QueryStatsMiddleware:
+    """Записывает число запросов, время БД, сериализации и размер ответа.
+
+    Время сериализации — время от вызова представления до готового ответа
+    без учёта запросов к БД, то есть работа представления и рендеринг.
+    Под ASGI запросы из потоков, в которых выполняются асинхронные
+    представления, учитываются через request.query_stats.track().
+    Запросы сверх бюджета пишутся в лог с уровнем WARNING, остальные —
+    с уровнем INFO.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        request.query_stats = stats = QueryStats()
+        request.view_timing = {}
+        with stats:
+            response = self.get_response(request)
+        return self.record(request, response)
+
+    async def __acall__(self, request):
+        request.query_stats = stats = QueryStats()
+        request.view_timing = {}
+        with stats:
+            response = await self.get_response(request)
+        return self.record(request, response)
+
+    def record(self, request, response):
+        stats = request.query_stats
+        if request.resolver_match is None:
+            return response
+        timing = request.view_timing
+        serialize_time = 0.0
+        if 'started' in timing:
+            serialize_time = (
+                time.perf_counter() - timing['started']
+                - (stats.db_time - timing['db_time'])
+            )
+        size = None if response.streaming else len(response.content)
+        name, view_class, action = get_view_action(request)
+        budget = get_query_budget(view_class, action)
+        logger.log(
+            logging.WARNING if budget is not None and stats.queries > budget
+            else logging.INFO,
+            'view=%s method=%s status=%s queries=%s budget=%s db_ms=%.1f '
+            'serialize_ms=%.1f total_ms=%.1f bytes=%s',
+            name, request.method, response.status_code, stats.queries,
+            budget, stats.db_time * 1000, serialize_time * 1000,
+            stats.total_time * 1000, size,
+        )
+        if settings.QUERY_STATS_HEADERS:
+            response['X-Query-Count'] = stats.queries
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f}, '
+                f'serialize;dur={serialize_time * 1000:.1f}, '
+                f'total;dur={stats.total_time * 1000:.1f}'
+            )
+            if size is not None:
+                response['X-Response-Size'] = size
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_timing['started'] = time.perf_counter()
+        request.view_timing['db_time'] = request.query_stats.db_time
+
+
+@contextmanager
+def assert_max_queries(budget):
+    """Падает с AssertionError, если в блоке выполнено больше budget
+    запросов."""
+    with QueryStats() as stats:
+        yield stats
+    if stats.queries > budget:
+        raise AssertionError(
+            f'{stats.queries} queries executed, budget is {budget}'
+        )
+
+
+def check_query_budget(client, path, method='get', **kwargs):
+    """Выполняет запрос тестовым клиентом и проверяет его по бюджету
+    запросов, объявленному в query_budgets представления."""
+    match = resolve(urlsplit(path).path)
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    budget = get_query_budget(getattr(match.func, 'cls', None), action)
+    if budget is None:
+        raise AssertionError(f'{path} declares no query budget for {action}')
+    with assert_max_queries(budget):
+        return getattr(client, method.lower())(path, **kwargs)
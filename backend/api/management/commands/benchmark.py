@@ -0,0 +1,121 @@
+import json
+import logging
+import platform
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.instrumentation import QueryStats
+from api.scenarios import (get_admin_client, get_admin_scenarios,
+                           get_clients, get_scenarios)
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+
+def percentile(values, fraction):
+    """Перцентиль с линейной интерполяцией между соседними значениями."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (
+        position - lower
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API endpoints through the test client'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help='Requests per scenario',
+        )
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Path of the JSON report',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--admin', action='store_true',
+            help='Also open admin pages as the first superuser',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        client, auth = get_clients()
+        logging.getLogger('api.stats').setLevel(logging.WARNING)
+        scenarios = list(get_scenarios(client, auth, rng))
+        if options['admin']:
+            scenarios.extend(get_admin_scenarios(get_admin_client(), rng))
+        results = [
+            self.run(name, client_, paths, options['iterations'])
+            for name, client_, paths in scenarios
+        ]
+        report = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'iterations': options['iterations'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        for result in results:
+            self.stdout.write(
+                f'{result["name"]:<40} {result["throughput_rps"]:>8.1f} rps '
+                f'p50 {result["latency_ms"]["p50"]:>7.1f} ms '
+                f'p99 {result["latency_ms"]["p99"]:>7.1f} ms '
+                f'queries {result["queries"]["max"]}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Report written to {options["output"]}'
+        ))
+
+    @staticmethod
+    def run(name, client, paths, iterations):
+        latencies = []
+        queries = []
+        sizes = []
+        started = time.perf_counter()
+        for number in range(iterations):
+            path = paths[number % len(paths)]
+            with QueryStats() as stats:
+                response = client.get(path)
+                content = b''.join(response) if response.streaming else (
+                    response.content
+                )
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{path} returned {response.status_code}: {content[:200]}'
+                )
+            latencies.append(stats.total_time * 1000)
+            queries.append(stats.queries)
+            sizes.append(len(content))
+        elapsed = time.perf_counter() - started
+        return {
+            'name': name,
+            'requests': iterations,
+            'throughput_rps': iterations / elapsed,
+            'latency_ms': {
+                'mean': statistics.mean(latencies),
+                'p50': percentile(latencies, 0.5),
+                'p90': percentile(latencies, 0.9),
+                'p99': percentile(latencies, 0.99),
+                'max': max(latencies),
+            },
+            'queries': {
+                'mean': statistics.mean(queries),
+                'max': max(queries),
+            },
+            'bytes_mean': statistics.mean(sizes),
+        }
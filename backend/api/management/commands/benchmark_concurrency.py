@@ -0,0 +1,163 @@
+import asyncio
+import json
+import random
+import time
+from itertools import cycle
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.management.commands.benchmark import percentile
+from api.scenarios import get_scenarios, get_token
+
+READ_SCENARIOS = (
+    'recipes_list_all', 'recipe_detail', 'download_shopping_cart_txt',
+    'ingredient_search',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a running server with concurrent clients to compare WSGI '
+        'and ASGI deployments'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'url', help='Server address, e.g. http://127.0.0.1:8000'
+        )
+        parser.add_argument(
+            '--label', default='',
+            help='Deployment name stored in the report, e.g. wsgi or asgi',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 8, 32, 128],
+            help='Numbers of simultaneous clients',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Requests per concurrency level',
+        )
+        parser.add_argument(
+            '--read-delay', type=float, default=0.0,
+            help='Pause in seconds after each 4 KB read to emulate slow '
+                 'clients',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=30.0,
+            help='Request timeout in seconds',
+        )
+        parser.add_argument(
+            '--scenarios', nargs='+', default=list(READ_SCENARIOS),
+        )
+        parser.add_argument(
+            '--output', default='benchmark_concurrency.json',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        address = urlsplit(options['url'])
+        if address.scheme != 'http' or not address.hostname:
+            raise CommandError('Only http:// server addresses are supported')
+        token = get_token()
+        requests = [
+            (quote(path, safe='/?&='), client == 'token')
+            for name, client, paths in get_scenarios(
+                'anonymous', 'token', random.Random(options['seed'])
+            )
+            if name in options['scenarios']
+            for path in paths
+        ]
+        if not requests:
+            raise CommandError('No scenarios selected')
+        self.address = address
+        self.headers = (
+            f'Host: {settings.ALLOWED_HOSTS[0]}\r\nConnection: close\r\n'
+        )
+        self.auth_header = f'Authorization: Token {token}\r\n'
+        results = [
+            asyncio.run(self.run_level(requests, level, options))
+            for level in options['concurrency']
+        ]
+        report = {
+            'created': timezone.now().isoformat(),
+            'label': options['label'],
+            'url': options['url'],
+            'read_delay': options['read_delay'],
+            'scenarios': options['scenarios'],
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        for result in results:
+            self.stdout.write(
+                f'{options["label"]:<6} concurrency '
+                f'{result["concurrency"]:>4} '
+                f'{result["throughput_rps"]:>8.1f} rps '
+                f'p50 {result["latency_ms"]["p50"]:>8.1f} ms '
+                f'p99 {result["latency_ms"]["p99"]:>8.1f} ms '
+                f'errors {result["errors"]}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Report written to {options["output"]}'
+        ))
+
+    async def run_level(self, requests, level, options):
+        semaphore = asyncio.Semaphore(level)
+        queue = cycle(requests)
+        latencies = []
+        errors = 0
+
+        async def worker(path, auth):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(
+                        self.fetch(path, auth, options['read_delay']),
+                        options['timeout'],
+                    )
+                except (OSError, asyncio.TimeoutError, ValueError):
+                    status = None
+                if status is None or status >= 500:
+                    errors += 1
+                else:
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(*next(queue)) for _ in range(options['requests'])
+        ))
+        elapsed = time.perf_counter() - started
+        return {
+            'concurrency': level,
+            'requests': options['requests'],
+            'errors': errors,
+            'throughput_rps': len(latencies) / elapsed,
+            'latency_ms': {
+                'p50': percentile(latencies, 0.5) if latencies else None,
+                'p90': percentile(latencies, 0.9) if latencies else None,
+                'p99': percentile(latencies, 0.99) if latencies else None,
+                'max': max(latencies, default=None),
+            },
+        }
+
+    async def fetch(self, path, auth, read_delay):
+        reader, writer = await asyncio.open_connection(
+            self.address.hostname, self.address.port or 80
+        )
+        try:
+            writer.write(
+                f'GET {path} HTTP/1.1\r\n{self.headers}'
+                f'{self.auth_header if auth else ""}\r\n'.encode()
+            )
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            while await reader.read(4096):
+                if read_delay:
+                    await asyncio.sleep(read_delay)
+            return status
+        finally:
+            writer.close()
@@ -0,0 +1,131 @@
+import json
+import platform
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer
+from api.scenarios import get_token
+from api.serializers import RecipeReadSerializer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare CPU time per recipe of RecipeReadSerializer rendered with '
+        'JSONRenderer and ORJSONRenderer, without and with the recipe '
+        'representation cache'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--items', type=int, default=500,
+            help='Recipes serialized per round',
+        )
+        parser.add_argument(
+            '--rounds', type=int, default=5,
+            help='Rounds per path after a warm-up round, the fastest one '
+                 'is reported',
+        )
+        parser.add_argument(
+            '--output', default='benchmark_serialization.json',
+        )
+
+    def handle(self, *args, **options):
+        user = Token.objects.select_related('user').get(key=get_token()).user
+        request = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0]).get(
+            '/api/recipes/'
+        )
+        request.user = user
+        context = {'request': request}
+        recipes = Recipe.objects.with_user_flags(user).order_by(
+            '-pub_date', '-id'
+        )[:options['items']]
+        paths = {
+            'json_renderer': lambda: self.measure(
+                lambda: list(recipes.read_values()),
+                lambda page: self.without_cache(
+                    RecipeReadSerializer(page, many=True, context=context)
+                ),
+                JSONRenderer(),
+            ),
+            'orjson_renderer': lambda: self.measure(
+                lambda: list(recipes.read_values()),
+                lambda page: self.without_cache(
+                    RecipeReadSerializer(page, many=True, context=context)
+                ),
+                ORJSONRenderer(),
+            ),
+            'cached_serializer': lambda: self.measure(
+                lambda: list(recipes.read_values()),
+                lambda page: RecipeReadSerializer(
+                    page, many=True, context=context
+                ).data,
+                ORJSONRenderer(),
+            ),
+        }
+        results = {}
+        content = {}
+        for name, measure in paths.items():
+            measure()
+            rounds = [measure() for _ in range(options['rounds'])]
+            content[name] = rounds[0][1]
+            items = len(json.loads(content[name]))
+            best = min(
+                (timings for timings, _ in rounds),
+                key=lambda timings: sum(timings.values()),
+            )
+            results[name] = {
+                'items': items,
+                'us_per_item': {
+                    stage: value * 1e6 / max(items, 1)
+                    for stage, value in best.items()
+                },
+            }
+        if len(set(content.values())) != 1:
+            raise CommandError('Serialized outputs differ')
+        report = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        for name, result in results.items():
+            stages = result['us_per_item']
+            self.stdout.write(
+                f'{name:<20} ' + ' '.join(
+                    f'{stage} {value:>7.1f} us' for stage, value in
+                    stages.items()
+                ) + f' total {sum(stages.values()):>7.1f} us per item'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Outputs are identical, report written to {options["output"]}'
+        ))
+
+    @staticmethod
+    def without_cache(serializer):
+        with override_settings(RECIPE_CACHE=None):
+            return serializer.data
+
+    @staticmethod
+    def measure(load, serialize, renderer):
+        """Процессорное время загрузки, сериализации и рендеринга."""
+        started = time.process_time()
+        page = load()
+        loaded = time.process_time()
+        data = serialize(page)
+        serialized = time.process_time()
+        content = renderer.render(data)
+        rendered = time.process_time()
+        return {
+            'load': loaded - started,
+            'serialize': serialized - loaded,
+            'render': rendered - serialized,
+        }, content
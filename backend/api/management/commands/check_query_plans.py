@@ -0,0 +1,132 @@
+import json
+import random
+import re
+from contextlib import ExitStack
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from api.scenarios import get_clients, get_scenarios
+
+ALIAS = re.compile(r'"(\w+)"\s+([A-Z]\d+)\b')
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on every query of the API read paths and fail on '
+        'sequential scans of large tables'
+    )
+    unindexed = {
+        'sqlite': {'recipes_list_search', 'recipes_list_search_phrase'},
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Tables with at least this many rows must not be scanned',
+        )
+        parser.add_argument(
+            '--paths', type=int, default=3,
+            help='Requests checked per scenario',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor not in {'postgresql', 'sqlite'}:
+            raise CommandError(f'{connection.vendor} is not supported')
+        client, auth = get_clients()
+        large = {
+            model._meta.db_table
+            for model in apps.get_models(include_auto_created=True)
+            if model.objects.count() >= options['min_rows']
+        }
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        failures = []
+        scenarios = get_scenarios(
+            client, auth, random.Random(options['seed'])
+        )
+        for name, client_, paths in scenarios:
+            if name in self.unindexed.get(connection.vendor, ()):
+                self.stdout.write(
+                    f'{name:<40} skipped, not indexed on {connection.vendor}'
+                )
+                continue
+            checked = self.check_paths(
+                name, client_, paths[:options['paths']], large, failures
+            )
+            self.stdout.write(f'{name:<40} {checked} queries checked')
+        for name, path, scanned, sql in failures:
+            self.stderr.write(
+                f'{name} {path}: sequential scan of '
+                f'{", ".join(sorted(scanned))}\n  {sql}'
+            )
+        if failures:
+            raise CommandError(
+                f'{len(failures)} queries scan large tables sequentially'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'No sequential scans of tables with at least '
+            f'{options["min_rows"]} rows'
+        ))
+
+    def check_paths(self, name, client, paths, large, failures):
+        checked = 0
+        for path in paths:
+            for sql, params in self.capture(client, path):
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                if ' WHERE ' not in sql:
+                    continue
+                checked += 1
+                scanned = self.sequential_scans(sql, params) & large
+                if scanned:
+                    failures.append((name, path, scanned, sql))
+        return checked
+
+    @staticmethod
+    def capture(client, path):
+        statements = []
+
+        def collect(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(collect)
+                )
+            response = client.get(path)
+            if response.streaming:
+                b''.join(response)
+        if response.status_code >= 400:
+            raise CommandError(f'{path} returned {response.status_code}')
+        return statements
+
+    def sequential_scans(self, sql, params):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return set(self.postgresql_scans(plan[0]['Plan']))
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            aliases = dict(
+                (alias, table) for table, alias in ALIAS.findall(sql)
+            )
+            scanned = set()
+            for row in cursor.fetchall():
+                match = SQLITE_SCAN.match(row[-1])
+                if match and 'USING' not in row[-1]:
+                    scanned.add(aliases.get(match[1], match[1]))
+            return scanned
+
+    def postgresql_scans(self, node):
+        if node['Node Type'] == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', ()):
+            yield from self.postgresql_scans(child)
@@ -1,6 +1,175 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (BasePagination, PageNumberPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по паре (pub_date, id) без COUNT и OFFSET.
+
+    Курсор хранит ключ последней (или первой) записи страницы, следующая
+    страница выбирается условием по ключу и использует индекс. Записи
+    страницы — строки Recipe.objects.read_values().
+    """
+    cursor_query_param = 'cursor'
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+        results = self.get_page(queryset, reverse, position, view)
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = bool(position), has_more
+        else:
+            self.has_next, self.has_previous = has_more, bool(position)
+        self.page = results
+        return results
+
+    def get_page(self, queryset, reverse, position, view):
+        return list(
+            self.order_by_key(queryset, reverse, position)[:self.page_size + 1]
+        )
+
+    @staticmethod
+    def order_by_key(queryset, reverse, position, fields=('pub_date', 'id')):
+        date, pk = fields
+        if reverse:
+            queryset = queryset.order_by(date, pk)
+        else:
+            queryset = queryset.order_by(f'-{date}', f'-{pk}')
+        if not position:
+            return queryset
+        pub_date, key = position
+        lookup = 'gt' if reverse else 'lt'
+        return queryset.filter(
+            Q(**{f'{date}__{lookup}': pub_date})
+            | Q(**{date: pub_date, f'{pk}__{lookup}': key})
+        )
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True, cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return False, None
+        try:
+            direction, pub_date, pk = urlsafe_b64decode(
+                cursor.encode()
+            ).decode().split('|')
+            return direction == 'r', (
+                datetime.fromisoformat(pub_date), int(pk)
+            )
+        except (DecodeError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe, reverse):
+        cursor = urlsafe_b64encode(
+            f'{"r" if reverse else "f"}|{recipe["pub_date"].isoformat()}|'
+            f'{recipe["id"]}'.encode()
+        ).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, cursor
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class FeedPagination(KeysetPagination):
+    """Курсорная пагинация ленты, собранной из нескольких источников.
+
+    Представление возвращает из get_feed_sources() запросы с парами
+    (pub_date, id рецепта). Из каждого источника берётся одна страница
+    ключей, страницы сливаются, и строки рецептов загружаются одним
+    запросом.
+    """
+
+    def get_page(self, queryset, reverse, position, view):
+        keys = set()
+        for source, fields in view.get_feed_sources():
+            keys.update(self.order_by_key(
+                source, reverse, position, fields
+            ).values_list(*fields)[:self.page_size + 1])
+        keys = sorted(keys, reverse=not reverse)[:self.page_size + 1]
+        recipes = {
+            recipe['id']: recipe
+            for recipe in queryset.filter(pk__in=[pk for _, pk in keys])
+        }
+        return [recipes[pk] for _, pk in keys if pk in recipes]
+
+
+class RecipePagination(LimitPageNumberPagination):
+    """Постраничная пагинация с курсорным режимом по параметру cursor.
+
+    Курсор задаёт порядок по дате публикации, поэтому вместе с ним нельзя
+    передавать параметры, задающие другой порядок, — например, search,
+    сортирующий по релевантности.
+    """
+    keyset_class = KeysetPagination
+    keyset_conflicting_params = ('search', )
+    keyset_conflict_message = 'Параметр нельзя передавать вместе с cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            conflicts = [
+                param for param in self.keyset_conflicting_params
+                if request.query_params.get(param)
+            ]
+            if conflicts:
+                raise ValidationError({
+                    param: [self.keyset_conflict_message]
+                    for param in conflicts
+                })
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
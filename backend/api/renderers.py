@@ -0,0 +1,156 @@
+import csv
+import io
+import json
+
+import orjson
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же результатом.
+
+    Как и JSONRenderer с настройками по умолчанию, выдаёт компактный
+    JSON в UTF-8 с экранированными U+2028 и U+2029. Даты и типы,
+    которых orjson не знает, передаются кодировщику DRF. Для отступов
+    и других настроек вывода используется JSONRenderer.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            self.ensure_ascii or not self.compact or self.get_indent(
+                accepted_media_type, renderer_context or {}
+            ) is not None
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        ).replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый класс выгрузки списка покупок.
+
+    Строки списка передаются в ответ по мере чтения из базы данных,
+    render используется только для ответов с ошибками.
+    """
+    charset = 'utf-8'
+    filename = 'shopping_list'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def line(ingredient):
+        return (
+            f'{ingredient["ingredient__name"]} '
+            f'({ingredient["ingredient__measurement_unit"]}) '
+            f'- {ingredient["amount"]}'
+        )
+
+    def stream(self, ingredients):
+        raise NotImplementedError
+
+    def response(self, ingredients):
+        response = StreamingHttpResponse(
+            (chunk.encode(self.charset) for chunk in self.stream(ingredients)),
+            content_type=f'{self.media_type}; charset={self.charset}',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename={self.filename}.{self.format}'
+        )
+        return response
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        separator = ''
+        for ingredient in ingredients:
+            yield separator + self.line(ingredient)
+            separator = '\n'
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('name', 'measurement_unit', 'amount')
+
+    def stream(self, ingredients):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.header)
+        for ingredient in ingredients:
+            writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['amount'],
+            ))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """Печатная версия списка покупок.
+
+    PDF требует таблицу смещений в конце файла, поэтому документ
+    собирается целиком и отдаётся с Content-Length.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+    line_height = 18
+
+    def register_font(self):
+        if self.font in pdfmetrics.getRegisteredFontNames():
+            return self.font
+        try:
+            pdfmetrics.registerFont(
+                TTFont(self.font, settings.SHOPPING_LIST_PDF_FONT)
+            )
+        except (OSError, TTFError):
+            return 'Helvetica'
+        return self.font
+
+    def response(self, ingredients):
+        buffer = io.BytesIO()
+        font = self.register_font()
+        width, height = A4
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setTitle('Список покупок')
+        y = height - self.margin
+        for ingredient in ingredients:
+            if y < self.margin:
+                pdf.showPage()
+                y = height - self.margin
+            pdf.setFont(font, self.font_size)
+            pdf.drawString(self.margin, y, self.line(ingredient))
+            y -= self.line_height
+        pdf.save()
+        response = HttpResponse(
+            buffer.getvalue(), content_type=self.media_type
+        )
+        response['Content-Length'] = len(response.content)
+        response['Content-Disposition'] = (
+            f'attachment; filename={self.filename}.{self.format}'
+        )
+        return response
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+def get_token():
+    """Токен пользователя с наибольшим числом рецептов в списке покупок
+    и подписок."""
+    user = User.objects.annotate(
+        carts=Count('cart_user', distinct=True),
+        follows=Count('follower', distinct=True),
+    ).order_by('-carts', '-follows').first()
+    if user is None or not Recipe.objects.exists():
+        raise CommandError(
+            'The database is empty, run manage.py generate_data first'
+        )
+    token, _ = Token.objects.get_or_create(user=user)
+    return token.key
+
+
+def get_clients():
+    """Анонимный клиент и клиент пользователя из get_token()."""
+    host = settings.ALLOWED_HOSTS[0]
+    return Client(HTTP_HOST=host), Client(
+        HTTP_HOST=host, HTTP_AUTHORIZATION=f'Token {get_token()}'
+    )
+
+
+def get_admin_client():
+    """Клиент, вошедший в админку под первым суперпользователем."""
+    user = User.objects.filter(is_superuser=True).order_by('pk').first()
+    if user is None:
+        raise CommandError(
+            'There is no superuser, run manage.py createsuperuser first'
+        )
+    client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    client.force_login(user)
+    return client
+
+
+def get_scenarios(client, auth, rng):
+    """Именованные наборы GET-запросов ко всем путям чтения API:
+    фильтры списка рецептов, рецепт, список покупок, подписки и поиск
+    ингредиентов."""
+    recipes = list(Recipe.objects.values_list('pk', flat=True)[:1000])
+    tags = list(Tag.objects.values_list('slug', flat=True))
+    author = Recipe.objects.values_list('author', flat=True).first()
+    filters = {
+        'all': '',
+        'tag': f'tags={tags[0]}',
+        'tags': '&'.join(f'tags={slug}' for slug in tags[:2]),
+        'author': f'author={author}',
+        'favorited': 'is_favorited=1',
+        'in_cart': 'is_in_shopping_cart=1',
+        'tag_favorited': f'tags={tags[0]}&is_favorited=1',
+        'author_tag_cart': (
+            f'author={author}&tags={tags[0]}&is_in_shopping_cart=1'
+        ),
+        'popular': 'ordering=-favorites_count',
+        'search': 'search=курица',
+        'search_phrase': 'search=сыр грибы',
+    }
+    for name, query in filters.items():
+        yield f'recipes_list_{name}', auth, [f'/api/recipes/?{query}']
+    yield 'recipes_list_pages', auth, [
+        f'/api/recipes/?page={page}' for page in range(1, 6)
+    ]
+    yield 'recipes_list_anonymous', client, ['/api/recipes/']
+    yield 'recipes_list_cursor', auth, ['/api/recipes/?cursor&limit=20']
+    yield 'recipe_detail', auth, [
+        f'/api/recipes/{pk}/' for pk in rng.sample(
+            recipes, min(len(recipes), 50)
+        )
+    ]
+    yield 'recipe_similar', auth, [
+        f'/api/recipes/{pk}/similar/' for pk in rng.sample(
+            recipes, min(len(recipes), 50)
+        )
+    ]
+    yield 'recommended', auth, ['/api/recipes/recommended/']
+    pantry = list(Ingredient.objects.filter(
+        recipeingredient__isnull=False
+    ).values_list('pk', flat=True).distinct()[:50])
+    yield 'pantry', client, [
+        '/api/recipes/pantry/?' + '&'.join(
+            f'ingredients={pk}' for pk in rng.sample(
+                pantry, min(len(pantry), 8)
+            )
+        ) + f'&tags={tags[0]}'
+        for _ in range(20)
+    ]
+    yield 'download_shopping_cart_txt', auth, [
+        '/api/recipes/download_shopping_cart/'
+    ]
+    yield 'download_shopping_cart_csv', auth, [
+        '/api/recipes/download_shopping_cart/?format=csv'
+    ]
+    yield 'feed', auth, ['/api/recipes/feed/']
+    yield 'feed_cursor', auth, ['/api/recipes/feed/?cursor&limit=20']
+    yield 'subscriptions', auth, [
+        '/api/users/subscriptions/?recipes_limit=3'
+    ]
+    names = list(Ingredient.objects.values_list('name', flat=True)[:200])
+    yield 'ingredient_search', client, [
+        f'/api/ingredients/?name={name[:rng.randint(1, 4)]}'
+        for name in names
+    ]
+
+
+def get_admin_scenarios(client, rng):
+    """Списки всех моделей админки с поиском, фильтрами и второй
+    страницей, страницы рецепта и автодополнение ингредиентов."""
+    recipes = list(Recipe.objects.values_list('pk', flat=True)[:1000])
+    tag = Tag.objects.values_list('pk', flat=True).first()
+    changelists = {
+        'users': ('/admin/users/user/', 'q=user'),
+        'subscriptions': ('/admin/users/subscribe/', 'q=user'),
+        'recipes': ('/admin/recipes/recipe/', 'q=курица'),
+        'ingredients': ('/admin/recipes/ingredient/', 'q=сол'),
+        'tags': ('/admin/recipes/tag/', 'q=а'),
+        'favorites': ('/admin/recipes/favorites/', 'q=курица'),
+        'shopping_carts': ('/admin/recipes/shoppingcart/', 'q=курица'),
+    }
+    for name, (path, search) in changelists.items():
+        yield f'admin_{name}', client, [path, f'{path}?p=2']
+        yield f'admin_{name}_search', client, [f'{path}?{search}']
+    yield 'admin_recipes_tag', client, [
+        f'/admin/recipes/recipe/?tags__id__exact={tag}'
+    ]
+    yield 'admin_recipe_change', client, [
+        f'/admin/recipes/recipe/{pk}/change/' for pk in rng.sample(
+            recipes, min(len(recipes), 20)
+        )
+    ]
+    yield 'admin_recipe_add', client, ['/admin/recipes/recipe/add/']
+    yield 'admin_autocomplete', client, [
+        '/admin/autocomplete/?app_label=recipes&model_name=recipeingredient'
+        f'&field_name=ingredient&term={term}'
+        for term in ('сол', 'мук', 'кур', 'сыр')
+    ]
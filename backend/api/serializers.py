@@ -1,14 +1,25 @@
 import base64
+from collections import defaultdict
+from functools import partial
+from uuid import uuid4
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 
-from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.images import process_recipe_image
+from recipes.models import (CartIngredient, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.tasks import run_in_background
+from recipes.versions import bump_data_version, get_recipe_cache
 from users.models import Subscribe, User
 
+from .cache import recipe_cache_keys
+
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
@@ -16,11 +27,41 @@ class Base64ImageField(serializers.ImageField):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
 
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = ContentFile(
+                base64.b64decode(imgstr), name=f'{uuid4().hex}.{ext}'
+            )
 
         return super().to_internal_value(data)
 
 
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии фото рецепта.
+
+    Пока копии не готовы, вместо каждой отдаётся исходное фото.
+    """
+    variants = {
+        'thumbnail': 'image_thumbnail',
+        'detail': 'image_detail',
+        'webp': 'image_webp',
+    }
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        images = {}
+        for name, field in self.variants.items():
+            image = getattr(recipe, field) or recipe.image
+            url = image.url if image else None
+            if url and request is not None:
+                url = request.build_absolute_uri(url)
+            images[name] = url
+        return images
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -65,22 +106,70 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     @staticmethod
-    def recipe_create_update(validated_data, instance=None):
+    def save_ingredients(instance, ingredients_data, created):
+        amounts = {
+            int(item['id']): int(item['amount']) for item in ingredients_data
+        }
+        existing = {}
+        if not created:
+            existing = {
+                item.ingredient_id: item
+                for item in RecipeIngredient.objects.filter(recipe=instance)
+            }
+        deltas = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        }
+        removed = []
+        changed = []
+        for ingredient_id, item in existing.items():
+            amount = amounts.get(ingredient_id, 0)
+            deltas[ingredient_id] = amount - item.amount
+            if not amount:
+                removed.append(item.pk)
+            elif item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        RecipeIngredient.objects.filter(pk__in=removed).delete()
+        RecipeIngredient.objects.bulk_update(changed, ('amount', ))
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ])
+        if amounts.keys() != existing.keys():
+            transaction.on_commit(
+                partial(bump_data_version, 'recipe-ingredients')
+            )
+        if not created:
+            CartIngredient.objects.apply(
+                ShoppingCart.objects.filter(
+                    recipe=instance
+                ).values_list('user', flat=True),
+                deltas,
+            )
+
+    @classmethod
+    @transaction.atomic
+    def recipe_create_update(cls, validated_data, instance=None):
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
-        if not instance:
+        created = instance is None
+        if created:
             instance = Recipe.objects.create(**validated_data)
         else:
-            instance.tags.clear()
-            RecipeIngredient.objects.filter(recipe=instance).delete()
-            instance.__dict__.update(validated_data)
-        for ingredient_data in ingredients_data:
-            ingredient = Ingredient.objects.get(id=ingredient_data['id'])
-            RecipeIngredient.objects.create(recipe=instance,
-                                            ingredient=ingredient,
-                                            amount=ingredient_data['amount'])
+            for field, value in validated_data.items():
+                setattr(instance, field, value)
+            if 'image' in validated_data:
+                instance.reset_image_variants()
+            instance.save()
+        if 'image' in validated_data:
+            run_in_background(process_recipe_image, instance.pk)
+        cls.save_ingredients(instance, ingredients_data, created)
         instance.tags.set(tags_data)
-        instance.save()
         return instance
 
     def validate(self, data):
@@ -96,11 +185,6 @@ class RecipeSerializer(serializers.ModelSerializer):
             )
         ingredient_list = []
         for ingredient_item in ingredients:
-            if not Ingredient.objects.filter(
-                    pk=ingredient_item['id']).exists():
-                raise serializers.ValidationError(
-                    'Ингредиента с таким id не существует'
-                )
             if int(ingredient_item['id']) in ingredient_list:
                 raise serializers.ValidationError('Укажите уникальный '
                                                   'ингредиент')
@@ -113,7 +197,12 @@ class RecipeSerializer(serializers.ModelSerializer):
                     'Укажите корректное количество ингредиента, '
                     'в диапазоне от 0,01 до 32766'
                 )
-            ingredient_list.append(ingredient_item['id'])
+            ingredient_list.append(int(ingredient_item['id']))
+        if Ingredient.objects.filter(
+                pk__in=ingredient_list).count() != len(ingredient_list):
+            raise serializers.ValidationError(
+                'Ингредиента с таким id не существует'
+            )
         data['ingredients'] = ingredients
         data['tags'] = tags
         return data
@@ -121,14 +210,23 @@ class RecipeSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         return self.recipe_create_update(validated_data)
 
+    def to_representation(self, instance):
+        prefetch_related_objects([instance], 'tags', Prefetch(
+            'recipeingredient_set',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ))
+        return super().to_representation(instance)
+
     def update(self, instance, validated_data):
         return self.recipe_create_update(validated_data, instance=instance)
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    images = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -136,6 +234,8 @@ class UserSerializer(serializers.ModelSerializer):
     is_subscribed = SerializerMethodField()
 
     def get_is_subscribed(self, instance):
+        if hasattr(instance, 'is_subscribed'):
+            return instance.is_subscribed
         request = self.context.get('request')
         if not self.context.get('request').user.is_authenticated:
             return False
@@ -162,7 +262,7 @@ class SubscribeSerializer(UserSerializer):
 
     @staticmethod
     def get_recipes_count(instance):
-        return instance.recipes.count()
+        return instance.recipes_count
 
     def validate(self, data):
         author_id = self.context.get(
@@ -178,6 +278,10 @@ class SubscribeSerializer(UserSerializer):
         return data
 
     def get_recipes(self, instance):
+        if 'recipes' in self.context:
+            return ShortRecipeSerializer(
+                self.context['recipes'].get(instance.id, []), many=True
+            ).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         recipes = instance.recipes.all()
@@ -190,38 +294,148 @@ class SubscribeSerializer(UserSerializer):
         return ShortRecipeSerializer(recipes, many=True).data
 
 
-class RecipeViewSerializer(serializers.ModelSerializer):
-    tags = TagSerializer(
-        many=True,
-        read_only=True,
-    )
-    author = UserSerializer(
-        read_only=True,
-    )
-    ingredients = RecipeIngredientSerializer(
-        source='recipeingredient_set',
-        many=True,
-        read_only=True,
-    )
-    image = Base64ImageField(required=True)
-    is_favorited = serializers.SerializerMethodField(read_only=True)
-    is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+class RecipeReadListSerializer(serializers.ListSerializer):
+    """Собирает страницу рецептов из строк read_values().
+
+    Части представлений, одинаковые для всех пользователей, берутся
+    одним запросом к кешу RECIPE_CACHE. Для рецептов, которых там нет,
+    поля, теги и ингредиенты читаются тремя запросами values_list
+    и сохраняются в кеш; флаги пользователя накладываются из строк.
+    """
+    tag_fields = ('id', 'name', 'color', 'slug')
+    ingredient_fields = ('id', 'name', 'measurement_unit', 'amount')
+
+    def to_representation(self, data):
+        rows = list(data)
+        ids = [row['id'] for row in rows]
+        cache = get_recipe_cache()
+        bodies = {}
+        if cache is not None:
+            keys = recipe_cache_keys(rows, self.child.url_base())
+            bodies = {
+                keys[key]: body
+                for key, body in cache.get_many(keys).items()
+            }
+        missing = [pk for pk in ids if pk not in bodies]
+        if missing:
+            built = self.build_bodies(missing)
+            bodies.update(built)
+            if cache is not None:
+                cache.set_many(
+                    {
+                        key: built[pk] for key, pk in keys.items()
+                        if pk in built
+                    },
+                    settings.RECIPE_CACHE_TIMEOUT,
+                )
+        return [
+            self.child.overlay(bodies[row['id']], row)
+            for row in rows if row['id'] in bodies
+        ]
+
+    def build_bodies(self, ids):
+        tags = defaultdict(list)
+        for recipe_id, *tag in Recipe.tags.through.objects.filter(
+            recipe__in=ids
+        ).order_by('tag_id').values_list(
+            'recipe', 'tag', 'tag__name', 'tag__color', 'tag__slug'
+        ):
+            tags[recipe_id].append(dict(zip(self.tag_fields, tag)))
+        ingredients = defaultdict(list)
+        for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+            recipe__in=ids
+        ).order_by('id').values_list(
+            'recipe', 'ingredient', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        ):
+            ingredients[recipe_id].append(
+                dict(zip(self.ingredient_fields, ingredient))
+            )
+        return {
+            row['id']: self.child.build(
+                row, tags[row['id']], ingredients[row['id']]
+            )
+            for row in Recipe.objects.filter(pk__in=ids).body_values()
+        }
+
+
+class RecipeReadSerializer(serializers.BaseSerializer):
+    """Сериализатор рецептов для чтения.
+
+    Принимает словари из Recipe.objects.read_values() и возвращает
+    представления рецептов без создания объектов моделей и полей DRF.
+    """
+    storage = Recipe._meta.get_field('image').storage
 
     class Meta:
-        model = Recipe
-        fields = ('id', 'tags', 'author',
-                  'ingredients', 'name', 'image',
-                  'text', 'cooking_time', 'is_favorited',
-                  'is_in_shopping_cart')
+        list_serializer_class = RecipeReadListSerializer
 
-    def is_item_related(self, recipe, model):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return model.objects.filter(user=request.user, recipe=recipe).exists()
+    def to_representation(self, row):
+        return RecipeReadListSerializer(
+            child=self, context=self.context
+        ).to_representation((row, ))[0]
 
-    def get_is_favorited(self, recipe):
-        return self.is_item_related(recipe, Favorites)
+    def url_base(self):
+        """Адрес сайта, к которому привязаны ссылки на фото."""
+        request = self.context.get('request')
+        if request is None:
+            return ''
+        return request.build_absolute_uri('/')
+
+    def image_url(self, name):
+        if not name:
+            return None
+        url = self.storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def build(self, row, tags, ingredients):
+        """Представление рецепта без флагов пользователя."""
+        image = self.image_url(row['image'])
+        author = None
+        if row['author__id'] is not None:
+            author = {
+                'id': row['author__id'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'username': row['author__username'],
+                'email': row['author__email'],
+            }
+        return {
+            'id': row['id'],
+            'tags': tags,
+            'author': author,
+            'ingredients': ingredients,
+            'name': row['name'],
+            'image': image,
+            'images': {
+                name: self.image_url(row[field]) if row[field] else image
+                for name, field in ImageVariantsField.variants.items()
+            },
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        }
 
-    def get_is_in_shopping_cart(self, recipe):
-        return self.is_item_related(recipe, ShoppingCart)
+    @staticmethod
+    def overlay(body, row):
+        """Добавляет к представлению из build() флаги пользователя."""
+        author = body['author']
+        if author is not None:
+            author = {**author, 'is_subscribed': row['author_is_subscribed']}
+        return {
+            **body,
+            'author': author,
+            'is_favorited': row['is_favorited'],
+            'is_in_shopping_cart': row['is_in_shopping_cart'],
+        }
+
+
+class BatchSerializer(serializers.Serializer):
+    """Список id рецептов или авторов для пакетных операций."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_IDS,
+    )
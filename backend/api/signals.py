@@ -0,0 +1,24 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_token
+from users.models import User
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(instance, **kwargs):
+    transaction.on_commit(partial(forget_token, instance.key))
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(instance, created, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        transaction.on_commit(partial(forget_token, key))
@@ -0,0 +1,1324 @@
+import csv
+import io
+import json
+import tempfile
+from contextlib import contextmanager
+from unittest import mock, skipIf, skipUnless
+
+from django.conf import settings
+from django.contrib.admin import site
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from foodgram.routers import PIN_COOKIE, ReplicaRouter
+
+from recipes.admin import EstimatedCountPaginator, RecipeAdmin
+from recipes.batch import add_links, recount
+from recipes.counters import reconcile_counters
+from recipes.images import missing_variants, process_recipe_image
+from recipes.management.commands.load_data import iter_json
+from recipes.models import (CartIngredient, Favorites, Ingredient, Recipe,
+                            RecipeIngredient, RecipeSimilarity, ShoppingCart,
+                            Tag, TimelineEntry)
+from recipes.recommendations import refresh_similarities
+from recipes.search import ingredient_index, pantry_index
+from recipes.versions import get_data_version
+from users.models import Subscribe, User
+
+from .authentication import TokenCache, tokens
+from .instrumentation import check_query_budget
+from .views import IngredientView, RecipeView, TagView, UserViewSet
+
+OTHER_PROCESS_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'other-process',
+}}
+
+
+def create_recipes(count, authors, ingredients, tags):
+    recipes = [
+        Recipe.objects.create(
+            author=authors[number % len(authors)],
+            name=f'Рецепт {number}',
+            image='recipe.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        for number in range(count)
+    ]
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe, ingredient=ingredient, amount=position + 1
+        )
+        for recipe in recipes
+        for position, ingredient in enumerate(ingredients[:3])
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for recipe in recipes
+        for tag in tags[:2]
+    )
+    return recipes
+
+
+class ApiTestCase(TestCase):
+    """Набор данных, на котором несколько рецептов в избранном, в списке
+    покупок и у авторов с подписками."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for number in range(3)
+        ]
+        cls.user = cls.authors[0]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        cls.tags = list(Tag.objects.order_by('id'))
+        cls.recipes = create_recipes(
+            120, cls.authors, cls.ingredients, cls.tags
+        )
+        Favorites.objects.bulk_create(
+            Favorites(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::3]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::4]
+        )
+        Subscribe.objects.create(user=cls.user, author=cls.authors[1])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def clear_caches():
+        for cache in caches.all():
+            cache.clear()
+
+    @contextmanager
+    def in_another_process(self):
+        """Изменения внутри блока делаются как в другом процессе: со своим
+        кешем и с выполнением обработчиков on_commit."""
+        with override_settings(CACHES=OTHER_PROCESS_CACHES):
+            with self.captureOnCommitCallbacks(execute=True):
+                yield
+
+    def count_queries(self, path):
+        self.clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return len(queries)
+
+
+class RecipeListQueriesTests(ApiTestCase):
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        small = self.count_queries('/api/recipes/?limit=6')
+        large = self.count_queries('/api/recipes/?limit=100')
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, RecipeView.query_budgets['list'])
+
+
+class KeysetPaginationTests(ApiTestCase):
+
+    def walk(self, path):
+        pages = []
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            path = pages[-1]['next']
+        return pages
+
+    def ids(self, page):
+        return [recipe['id'] for recipe in page['results']]
+
+    def expected(self):
+        return list(Recipe.objects.order_by('-pub_date', '-id').values_list(
+            'id', flat=True
+        ))
+
+    def test_next_and_previous_links_round_trip(self):
+        pages = self.walk('/api/recipes/?cursor=&limit=50')
+        self.assertEqual(
+            [len(page['results']) for page in pages], [50, 50, 20]
+        )
+        self.assertEqual(
+            [pk for page in pages for pk in self.ids(page)], self.expected()
+        )
+        self.assertIsNone(pages[0]['previous'])
+        previous = self.client.get(pages[2]['previous']).json()
+        self.assertEqual(self.ids(previous), self.ids(pages[1]))
+        self.assertEqual(previous['next'], pages[1]['next'])
+
+    def test_recipes_with_equal_dates_are_not_skipped(self):
+        Recipe.objects.update(pub_date=self.recipes[0].pub_date)
+        pages = self.walk('/api/recipes/?cursor=&limit=7')
+        self.assertEqual(
+            [pk for page in pages for pk in self.ids(page)],
+            sorted((recipe.pk for recipe in self.recipes), reverse=True),
+        )
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('garbage', 'Znw0Mnwx', 'Znxub3QtYS1kYXRlfDE='):
+            response = self.client.get(f'/api/recipes/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_page_size_is_capped(self):
+        for path in ('/api/recipes/?cursor=&limit=1000',
+                     '/api/recipes/?limit=1000'):
+            response = self.client.get(path)
+            self.assertEqual(len(response.json()['results']), 100, path)
+
+    def test_search_is_rejected_with_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=&search=Рецепт')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.json())
+
+
+class RecipeWriteTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+
+    def rows(self):
+        return {
+            ingredient: (pk, amount)
+            for pk, ingredient, amount in RecipeIngredient.objects.filter(
+                recipe=self.recipe
+            ).values_list('pk', 'ingredient', 'amount')
+        }
+
+    def update(self, amounts):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {
+                'ingredients': [
+                    {'id': self.ingredients[index].pk, 'amount': amount}
+                    for index, amount in amounts.items()
+                ],
+                'tags': [self.tags[0].pk],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content[:200])
+
+    def test_update_writes_only_changed_ingredients(self):
+        first, second, third, fourth, _ = (
+            ingredient.pk for ingredient in self.ingredients
+        )
+        before = self.rows()
+        self.update({0: 1, 1: 5, 3: 4})
+        after = self.rows()
+        self.assertEqual(set(after), {first, second, fourth})
+        self.assertEqual(after[first], before[first])
+        self.assertEqual(after[second], (before[second][0], 5))
+        self.assertEqual(after[fourth][1], 4)
+        self.assertEqual(
+            list(self.recipe.tags.values_list('pk', flat=True)),
+            [self.tags[0].pk],
+        )
+
+        self.update({0: 1, 1: 5, 2: 7})
+        again = self.rows()
+        self.assertEqual(set(again), {first, second, third})
+        self.assertEqual(again[third][1], 7)
+        self.assertNotEqual(again[third][0], before[third][0])
+        self.assertEqual(again[second], after[second])
+
+    def test_unknown_or_repeated_ingredients_are_rejected(self):
+        for ingredients in (
+            [{'id': 0, 'amount': 1}],
+            [{'id': self.ingredients[0].pk, 'amount': 1}] * 2,
+        ):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/',
+                {'ingredients': ingredients, 'tags': [self.tags[0].pk]},
+                format='json',
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.rows()), 3)
+
+
+class CartTotalsTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.shopper = self.authors[2]
+        self.client.force_authenticate(self.shopper)
+        self.first, self.second = self.recipes[1:3]
+
+    def totals(self):
+        return dict(CartIngredient.objects.filter(
+            user=self.shopper, amount__gt=0
+        ).values_list('ingredient__name', 'amount'))
+
+    def cart(self, method, recipe):
+        response = getattr(self.client, method)(
+            f'/api/recipes/{recipe.pk}/shopping_cart/'
+        )
+        self.assertIn(response.status_code, (201, 204))
+
+    def test_totals_follow_added_and_removed_recipes(self):
+        self.cart('post', self.first)
+        self.cart('post', self.second)
+        self.assertEqual(self.totals(), {
+            'ингредиент 0': 2, 'ингредиент 1': 4, 'ингредиент 2': 6,
+        })
+        self.cart('delete', self.first)
+        self.assertEqual(self.totals(), {
+            'ингредиент 0': 1, 'ингредиент 1': 2, 'ингредиент 2': 3,
+        })
+        self.cart('delete', self.second)
+        self.assertEqual(self.totals(), {})
+
+    def test_admin_inline_edit_rebuilds_totals(self):
+        self.cart('post', self.first)
+        RecipeIngredient.objects.filter(
+            recipe=self.first, ingredient=self.ingredients[0]
+        ).update(amount=10)
+        RecipeIngredient.objects.filter(
+            recipe=self.first, ingredient=self.ingredients[1]
+        ).delete()
+        RecipeIngredient.objects.create(
+            recipe=self.first, ingredient=self.ingredients[4], amount=7
+        )
+        RecipeAdmin(Recipe, site).save_related(
+            None, mock.Mock(instance=self.first), [], True
+        )
+        self.assertEqual(self.totals(), {
+            'ингредиент 0': 10, 'ингредиент 2': 3, 'ингредиент 4': 7,
+        })
+
+
+class SubscriptionsTests(ApiTestCase):
+    path = '/api/users/subscriptions/?recipes_limit=2'
+
+    def test_queries_do_not_depend_on_authors_or_recipes_limit(self):
+        one_author = self.count_queries(self.path)
+        Subscribe.objects.create(user=self.user, author=self.authors[2])
+        self.assertEqual(self.count_queries(self.path), one_author)
+        self.assertEqual(
+            self.count_queries('/api/users/subscriptions/?recipes_limit=30'),
+            one_author,
+        )
+        self.assertLessEqual(
+            one_author, UserViewSet.query_budgets['subscriptions']
+        )
+
+    def test_each_author_gets_the_latest_recipes(self):
+        Subscribe.objects.create(user=self.user, author=self.authors[2])
+        authors = self.client.get(self.path).json()['results']
+        self.assertEqual(
+            {author['id']: [recipe['id'] for recipe in author['recipes']]
+             for author in authors},
+            {
+                author.pk: [
+                    recipe.pk for recipe in self.recipes[::-1]
+                    if recipe.author == author
+                ][:2]
+                for author in self.authors[1:]
+            },
+        )
+        self.assertEqual(
+            [author['recipes_count'] for author in authors], [40, 40]
+        )
+        self.assertTrue(all(author['is_subscribed'] for author in authors))
+
+
+class CountersTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        reconcile_counters()
+        self.recipe = self.recipes[1]
+        self.author = self.recipe.author
+
+    def counters(self):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        return (
+            self.recipe.favorites_count, self.recipe.in_carts_count,
+            self.author.recipes_count, self.author.followers_count,
+        )
+
+    def test_counters_follow_api_changes(self):
+        self.assertEqual(self.counters(), (0, 0, 40, 1))
+        for user in (self.user, self.authors[2]):
+            self.client.force_authenticate(user)
+            for path in (f'/api/recipes/{self.recipe.pk}/favorite/',
+                         f'/api/recipes/{self.recipe.pk}/shopping_cart/'):
+                self.assertEqual(self.client.post(path).status_code, 201)
+        response = self.client.post(f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.counters(), (2, 2, 40, 2))
+        self.client.delete(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.client.delete(f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(self.counters(), (1, 2, 40, 1))
+
+    def test_cascades_keep_counters_exact(self):
+        Favorites.objects.create(user=self.authors[2], recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.authors[2], recipe=self.recipe)
+        self.authors[2].delete()
+        self.assertEqual(self.counters(), (0, 0, 40, 1))
+        self.user.delete()
+        self.assertEqual(self.counters(), (0, 0, 40, 0))
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in self.recipes[4:16:3]]
+        ).delete()
+        self.assertEqual(self.counters(), (0, 0, 36, 0))
+        self.assertEqual(set(reconcile_counters(check=True).values()), {0})
+
+
+class TokenAuthenticationTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tokens.clear()
+        self.client = APIClient()
+        response = self.client.post('/api/auth/token/login/', {
+            'email': self.user.email, 'password': 'password',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.json()["auth_token"]}'
+        )
+
+    def me(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/me/')
+        return response.status_code, len(queries)
+
+    def test_cached_token_skips_the_lookup(self):
+        status, cold = self.me()
+        self.assertEqual(status, 200)
+        self.assertEqual(self.me(), (200, cold - 1))
+
+    def test_token_revoked_on_logout_is_rejected_before_ttl(self):
+        self.assertEqual(self.me()[0], 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.me()[0], 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.me()[0], 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.me()[0], 401)
+
+    def test_entries_expire_after_ttl(self):
+        cache = TokenCache(size=2, ttl=60)
+        with mock.patch('api.authentication.time.monotonic') as clock:
+            clock.return_value = 100
+            for key in 'abc':
+                cache.set(key, key.upper())
+            self.assertEqual(
+                [cache.get(key) for key in 'abc'], [None, 'B', 'C']
+            )
+            clock.return_value = 160
+            self.assertIsNone(cache.get('b'))
+
+
+class EstimatedCountPaginatorTests(ApiTestCase):
+
+    def paginator(self, plan_rows=None):
+        paginator = EstimatedCountPaginator(
+            Recipe.objects.order_by('-pk'), 20
+        )
+        if plan_rows is None:
+            return paginator, mock.MagicMock()
+        database = mock.MagicMock(vendor='postgresql')
+        cursor = database.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (
+            json.dumps([{'Plan': {'Plan Rows': plan_rows}}]),
+        )
+        return paginator, database
+
+    def test_exact_count_outside_postgresql(self):
+        paginator, _ = self.paginator()
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 120)
+        self.assertEqual(paginator.num_pages, 6)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=1000)
+    def test_large_tables_use_the_planner_estimate(self):
+        paginator, database = self.paginator(plan_rows=250000)
+        with mock.patch('recipes.admin.connections', {'default': database}):
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 250000)
+        sql = database.cursor().__enter__().execute.call_args[0][0]
+        self.assertTrue(sql.startswith('EXPLAIN (FORMAT JSON) SELECT'))
+        self.assertNotIn('ORDER BY', sql)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=1000)
+    def test_small_estimates_are_counted_exactly(self):
+        paginator, database = self.paginator(plan_rows=90)
+        with mock.patch('recipes.admin.connections', {'default': database}):
+            with self.assertNumQueries(1):
+                self.assertEqual(paginator.count, 120)
+
+    def test_changelist_does_not_count_the_whole_table(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/recipes/recipe/')
+        self.assertEqual(response.status_code, 200)
+        counts = [
+            query['sql'] for query in queries
+            if 'COUNT(*)' in query['sql'] and 'recipes_recipe' in query['sql']
+        ]
+        self.assertEqual(len(counts), 1, counts)
+
+
+class RecipeSearchTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.soup, self.salad, self.pie = (
+            Recipe.objects.create(
+                author=self.user, name=name, text=text, image='recipe.png',
+                cooking_time=10,
+            )
+            for name, text in (
+                ('Борщ с капустой', 'Сварить бульон'),
+                ('Салат', 'Подавать с капустой'),
+                ('Пирог с капустой', 'Испечь'),
+            )
+        )
+
+    def search(self, query):
+        response = self.client.get(f'/api/recipes/?search={query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_name_matches_rank_above_text_matches(self):
+        self.assertEqual(
+            self.search('капустой'),
+            [self.pie.pk, self.soup.pk, self.salad.pk],
+        )
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('капустой бульон'), [self.soup.pk])
+        self.assertEqual(self.search('капустой хлебу'), [])
+
+    def test_index_is_declared_in_the_schema(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Recipe._meta.db_table
+            )
+        self.assertEqual(
+            constraints['recipe_search_vector_idx']['columns'],
+            ['search_vector'],
+        )
+
+    @skipIf(connection.vendor == 'postgresql', 'поиск по search_vector')
+    def test_fallback_matches_parts_of_words(self):
+        self.assertEqual(
+            self.search('апуст'),
+            [self.pie.pk, self.soup.pk, self.salad.pk],
+        )
+        self.assertIsNone(
+            Recipe.objects.get(pk=self.soup.pk).search_vector
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'нужен PostgreSQL')
+    def test_vector_is_saved_without_an_extra_query(self):
+        self.salad.name = 'Салат из свёклы'
+        with self.assertNumQueries(1):
+            self.salad.save(update_fields=['name'])
+        self.assertEqual(self.search('салат'), [self.salad.pk])
+        self.assertIn("'салат'", self.salad.search_vector)
+
+
+class IngredientSearchTests(ApiTestCase):
+
+    def test_index_sees_ingredients_added_by_another_process(self):
+        path = '/api/ingredients/?name=шафран'
+        self.assertEqual(self.client.get(path).json(), [])
+        with self.in_another_process():
+            Ingredient.objects.create(name='шафран', measurement_unit='г')
+        names = [item['name'] for item in self.client.get(path).json()]
+        self.assertEqual(names, ['шафран'])
+
+    def test_search_is_unbounded_unless_limit_is_given(self):
+        path = '/api/ingredients/?name=ингредиент'
+        for query, expected in (('', 5), ('&limit=0', 5), ('&limit=2', 2)):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    len(self.client.get(path + query).json()), expected
+                )
+
+
+class ReferenceDataCacheTests(ApiTestCase):
+
+    def test_cached_tags_change_after_edit_in_another_process(self):
+        self.clear_caches()
+        tag = self.tags[0]
+        names = [item['name'] for item in self.client.get('/api/tags/').json()]
+        self.assertIn(tag.name, names)
+        with self.in_another_process():
+            tag.name = 'Полдник'
+            tag.save()
+        names = [item['name'] for item in self.client.get('/api/tags/').json()]
+        self.assertIn('Полдник', names)
+
+    def test_conditional_get_relies_on_etag(self):
+        response = self.client.get('/api/tags/')
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        for name in ('Полдник', 'Перекус'):
+            with self.in_another_process():
+                self.tags[0].name = name
+                self.tags[0].save()
+            response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+
+class RecipeCacheTests(ApiTestCase):
+
+    def test_cached_recipe_follows_edits_from_another_process(self):
+        self.clear_caches()
+        recipe = self.recipes[0]
+        path = f'/api/recipes/{recipe.pk}/'
+        self.client.get(path)
+        with self.in_another_process():
+            author = recipe.author
+            author.first_name = 'Другое'
+            author.save()
+            row = recipe.recipeingredient_set.order_by('id').first()
+            row.amount = 42
+            row.save()
+            tag = recipe.tags.order_by('id').first()
+            tag.name = 'Полдник'
+            tag.save()
+        data = self.client.get(path).json()
+        self.assertEqual(data['author']['first_name'], 'Другое')
+        self.assertEqual(data['ingredients'][0]['amount'], 42)
+        self.assertEqual(data['tags'][0]['name'], 'Полдник')
+
+
+class ReadQueryBudgetTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ingredient_index.search('')
+        pantry_index.refresh()
+
+    def read_paths(self):
+        recipe = self.recipes[0].pk
+        ingredients = '&'.join(
+            f'ingredients={ingredient.pk}'
+            for ingredient in self.ingredients[:2]
+        )
+        return {
+            (TagView, 'list'): '/api/tags/',
+            (TagView, 'retrieve'): f'/api/tags/{self.tags[0].pk}/',
+            (IngredientView, 'list'): '/api/ingredients/?name=ингредиент',
+            (IngredientView, 'retrieve'):
+                f'/api/ingredients/{self.ingredients[0].pk}/',
+            (RecipeView, 'list'): '/api/recipes/?limit=6',
+            (RecipeView, 'retrieve'): f'/api/recipes/{recipe}/',
+            (RecipeView, 'download_shopping_cart'):
+                '/api/recipes/download_shopping_cart/',
+            (RecipeView, 'feed'): '/api/recipes/feed/',
+            (RecipeView, 'similar'): f'/api/recipes/{recipe}/similar/',
+            (RecipeView, 'recommended'): '/api/recipes/recommended/',
+            (RecipeView, 'pantry'): f'/api/recipes/pantry/?{ingredients}',
+            (UserViewSet, 'subscriptions'): '/api/users/subscriptions/',
+        }
+
+    def test_every_budget_is_covered(self):
+        declared = {
+            (view, action)
+            for view in (TagView, IngredientView, RecipeView, UserViewSet)
+            for action in view.query_budgets
+        }
+        self.assertEqual(declared, set(self.read_paths()))
+
+    def test_read_actions_stay_within_budget(self):
+        for (view, action), path in self.read_paths().items():
+            with self.subTest(view=view.__name__, action=action):
+                self.clear_caches()
+                for _ in range(2):
+                    response = check_query_budget(self.client, path)
+                    self.assertEqual(response.status_code, 200)
+
+
+class LoadDataTests(ApiTestCase):
+    rows = [
+        ('ингредиент 0', 'г'),
+        ('соль, "крупная"', 'г'),
+        ('соль, "крупная"', 'кг'),
+        ('сахар', 'г'),
+    ]
+
+    def load(self, name, content):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/{name}'
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(content)
+            output = io.StringIO()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command(
+                    'load_data', path, batch_size=2, no_copy=True,
+                    stdout=output,
+                )
+        return output.getvalue()
+
+    def loaded(self):
+        return set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'
+        )) - {('ингредиент 1', 'г'), ('ингредиент 2', 'г'),
+              ('ингредиент 3', 'г'), ('ингредиент 4', 'г')}
+
+    def test_json_is_decoded_across_chunk_boundaries(self):
+        content = json.dumps([
+            {'name': name, 'measurement_unit': unit}
+            for name, unit in self.rows
+        ], ensure_ascii=False, indent=2)
+        for chunk_size in (1, 7, 64 * 1024):
+            self.assertEqual(
+                list(iter_json(io.StringIO(content), chunk_size)), self.rows
+            )
+        for broken in ('{}', '[{"name": "соль"', '[{"name": }]'):
+            with self.assertRaises(CommandError):
+                list(iter_json(io.StringIO(broken), 4))
+
+    def test_json_and_csv_files_insert_only_new_ingredients(self):
+        version = get_data_version(IngredientView.cache_name)
+        output = self.load('ingredients.json', json.dumps([
+            {'name': name, 'measurement_unit': unit}
+            for name, unit in self.rows
+        ]))
+        self.assertIn('4 rows read, 3 created', output)
+        self.assertNotEqual(
+            get_data_version(IngredientView.cache_name), version
+        )
+        csv_file = io.StringIO()
+        csv.writer(csv_file).writerows(self.rows + [('перец', 'г')])
+        output = self.load('ingredients.csv', csv_file.getvalue())
+        self.assertIn('5 rows read, 1 created', output)
+        self.assertEqual(
+            self.loaded(), set(self.rows) | {('перец', 'г')}
+        )
+
+
+class IngredientMergeMigrationTests(TransactionTestCase):
+    before = [('recipes', '0006_recipe_image_variants')]
+    after = [('recipes', '0007_ingredient_name_unit_unique')]
+
+    def migrate(self, targets):
+        apps = MigrationExecutor(connection).migrate(targets).apps
+        return lambda model: apps.get_model('recipes', model).objects
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged_into_the_first_ingredient(self):
+        rows = self.migrate(self.before)
+        user = User.objects.create(username='cook', email='cook@example.com')
+        kept, duplicate, other = (
+            rows('Ingredient').create(name=name, measurement_unit='г')
+            for name in ('соль', 'соль', 'сахар')
+        )
+        both, only_duplicate = (
+            rows('Recipe').create(
+                author_id=user.pk, name=name, image='recipe.png',
+                text='Описание', cooking_time=10,
+            ).pk
+            for name in ('Оба', 'Дубликат')
+        )
+        for recipe, ingredient, amount in (
+            (both, kept, 5),
+            (both, duplicate, 32765),
+            (both, other, 1),
+            (only_duplicate, duplicate, 3),
+        ):
+            rows('RecipeIngredient').create(
+                recipe_id=recipe, ingredient_id=ingredient.pk, amount=amount
+            )
+        for ingredient, amount in ((kept, 1), (duplicate, 4)):
+            rows('CartIngredient').create(
+                user_id=user.pk, ingredient_id=ingredient.pk, amount=amount
+            )
+
+        rows = self.migrate(self.after)
+        self.assertEqual(
+            sorted(rows('Ingredient').values_list('pk', 'name')),
+            [(kept.pk, 'соль'), (other.pk, 'сахар')],
+        )
+        self.assertEqual(
+            sorted(rows('RecipeIngredient').values_list(
+                'recipe', 'ingredient', 'amount'
+            )),
+            sorted([
+                (both, kept.pk, 32766),
+                (both, other.pk, 1),
+                (only_duplicate, kept.pk, 3),
+            ]),
+        )
+        self.assertEqual(
+            list(rows('CartIngredient').values_list('ingredient', 'amount')),
+            [(kept.pk, 5)],
+        )
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Реплика replica — зеркало тестовой базы, которое добавляется
+    только на время этих тестов и не зависит от настроек и способа
+    запуска."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict,
+            'TEST': {'MIRROR': 'default'},
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='password'
+        )
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        self.recipe = create_recipes(1, [self.user], [ingredient], [])[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.addCleanup(ReplicaRouter.down_until.clear)
+
+    def count_queries(self, client, path='/api/recipes/'):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_reads_go_to_replica(self):
+        primary, replica = self.count_queries(self.client)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_client_reads_primary_after_write(self):
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        primary, replica = self.count_queries(self.client)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        other = APIClient()
+        other.force_authenticate(self.user)
+        self.assertEqual(self.count_queries(other)[0], 0)
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with mock.patch.object(
+                connections['replica'], 'ensure_connection',
+                side_effect=OperationalError,
+            ):
+                response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(primary), 0)
+        self.assertIn('replica', ReplicaRouter.down_until)
+
+    def test_failed_replica_query_is_retried_on_primary(self):
+        def fail(execute, sql, params, many, context):
+            raise OperationalError('server closed the connection')
+
+        with connections['replica'].execute_wrapper(fail):
+            primary, _ = self.count_queries(self.client)
+        self.assertGreater(primary, 0)
+        self.assertIn('replica', ReplicaRouter.down_until)
+
+
+class BatchLinksTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        CartIngredient.objects.rebuild([self.user.pk])
+        recount(ShoppingCart, [recipe.pk for recipe in self.recipes])
+
+    def cart_totals(self):
+        return dict(CartIngredient.objects.filter(
+            user=self.user, amount__gt=0
+        ).values_list('ingredient', 'amount'))
+
+    def test_batch_removal_updates_totals_once(self):
+        removed = [recipe.pk for recipe in self.recipes[:8:4]]
+        response = self.client.delete(
+            '/api/recipes/shopping_cart/batch/', {'ids': removed},
+            format='json',
+        )
+        self.assertEqual(
+            [item['status'] for item in response.json()['results']],
+            ['removed', 'removed'],
+        )
+        self.assertEqual(self.cart_totals(), {
+            row['ingredient']: row['total']
+            for row in CartIngredient.objects.expected([self.user.pk])
+        })
+        self.assertEqual(
+            set(Recipe.objects.filter(pk__in=removed).values_list(
+                'in_carts_count', flat=True
+            )),
+            {0},
+        )
+
+    def test_insert_skips_links_created_outside_the_lock(self):
+        recipe = self.recipes[0]
+        stale = mock.patch(
+            'recipes.batch.link_states', return_value={recipe.pk: False}
+        )
+        with stale:
+            add_links(ShoppingCart, self.user, [recipe.pk])
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user, recipe=recipe).count(),
+            1,
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.in_carts_count, 1)
+
+    def test_batch_add_updates_totals_of_inserted_rows(self):
+        added = [recipe.pk for recipe in self.recipes[1:3]]
+        response = self.client.post(
+            '/api/recipes/shopping_cart/batch/',
+            {'ids': added + [self.recipes[0].pk]}, format='json',
+        )
+        self.assertEqual(
+            [item['status'] for item in response.json()['results']],
+            ['added', 'added', 'exists'],
+        )
+        self.assertEqual(self.cart_totals(), {
+            row['ingredient']: row['total']
+            for row in CartIngredient.objects.expected([self.user.pk])
+        })
+
+
+class RecommendationTests(ApiTestCase):
+    """Рецепты 1 и 2 в избранном только у authors[2], рецепты 0 и 1 —
+    у authors[1]; у authors[0] рецепты из setUpTestData."""
+
+    def setUp(self):
+        super().setUp()
+        first, second = self.authors[1], self.authors[2]
+        Favorites.objects.bulk_create([
+            Favorites(user=second, recipe=self.recipes[1]),
+            Favorites(user=second, recipe=self.recipes[2]),
+            Favorites(user=first, recipe=self.recipes[0]),
+            Favorites(user=first, recipe=self.recipes[1]),
+        ])
+        recount(Favorites, [recipe.pk for recipe in self.recipes])
+        refresh_similarities(settings.RECOMMENDATION_NEIGHBOURS, 50)
+
+    def get_ids(self, path, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.user)
+        response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()]
+
+    def test_similar_returns_stored_neighbours(self):
+        recipe = self.recipes[2]
+        self.assertEqual(
+            self.get_ids(f'/api/recipes/{recipe.pk}/similar/'),
+            [self.recipes[1].pk],
+        )
+
+    def test_similar_of_unknown_recipe_is_not_found(self):
+        for pk in ('abc', '0', str(self.recipes[-1].pk + 1)):
+            with self.subTest(pk=pk):
+                response = self.client.get(f'/api/recipes/{pk}/similar/')
+                self.assertEqual(response.status_code, 404)
+
+    def test_recommended_skips_recipes_the_user_already_has(self):
+        self.assertEqual(
+            self.get_ids('/api/recipes/recommended/', self.authors[2]),
+            [self.recipes[0].pk],
+        )
+
+    def test_recommended_without_history_returns_popular_recipes(self):
+        newcomer = User.objects.create_user(
+            username='newcomer', email='newcomer@example.com',
+            password='password',
+        )
+        popular = list(Recipe.objects.order_by(
+            '-favorites_count', '-id'
+        ).values_list('id', flat=True)[:5])
+        self.assertEqual(
+            self.get_ids('/api/recipes/recommended/?limit=5', newcomer),
+            popular,
+        )
+        self.assertEqual(popular[0], self.recipes[1].pk)
+
+    def test_refresh_rewrites_only_changed_recipes(self):
+        self.assertEqual(
+            refresh_similarities(settings.RECOMMENDATION_NEIGHBOURS, 50)[0],
+            0,
+        )
+        Favorites.objects.filter(recipe=self.recipes[2]).delete()
+        updated, _, removed = refresh_similarities(
+            settings.RECOMMENDATION_NEIGHBOURS, 50
+        )
+        self.assertEqual((updated, removed), (1, 1))
+        self.assertFalse(
+            RecipeSimilarity.objects.filter(recipe=self.recipes[2]).exists()
+        )
+        self.assertEqual(
+            self.get_ids(f'/api/recipes/{self.recipes[1].pk}/similar/'),
+            [self.recipes[0].pk],
+        )
+
+
+class ShoppingListTests(ApiTestCase):
+    path = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        super().setUp()
+        CartIngredient.objects.rebuild([self.user.pk])
+
+    def download(self, query='', **headers):
+        return self.client.get(self.path + query, **headers)
+
+    def test_formats(self):
+        expected = [
+            (f'ингредиент {number}', 'г', str(30 * (number + 1)))
+            for number in range(3)
+        ]
+        response = self.download()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(),
+            '\n'.join(f'{name} ({unit}) - {amount}'
+                      for name, unit, amount in expected),
+        )
+        response = self.download('?format=csv')
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(
+            b''.join(response.streaming_content).decode()
+        )))
+        self.assertEqual(
+            rows, [['name', 'measurement_unit', 'amount']]
+            + [list(row) for row in expected]
+        )
+        response = self.download('?format=pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertEqual(
+            int(response['Content-Length']), len(response.content)
+        )
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.download()['ETag']
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.download('?format=csv')['ETag'], etag)
+
+    def test_etag_changes_with_cart_and_ingredient_names(self):
+        etag = self.download()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            ShoppingCart.objects.create(user=self.user, recipe=self.recipes[1])
+        self.assertNotEqual(self.download()['ETag'], etag)
+        etag = self.download()['ETag']
+        ingredient = self.ingredients[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.measurement_unit = 'кг'
+            ingredient.save()
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'ингредиент 0 (кг)', b''.join(response.streaming_content).decode()
+        )
+
+
+class RecipeImageTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.recipe = self.recipes[0]
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 800), 'orange').save(buffer, format='PNG')
+        self.recipe.image.save('photo.png', ContentFile(buffer.getvalue()))
+
+    def open_image(self, field):
+        with field.open('rb') as file:
+            return Image.open(io.BytesIO(file.read()))
+
+    def test_variants_replace_the_original_photo(self):
+        original = self.recipe.image.name
+        process_recipe_image(self.recipe.pk)
+        self.recipe.refresh_from_db()
+        storage = self.recipe.image.storage
+        self.assertNotEqual(self.recipe.image.name, original)
+        self.assertFalse(storage.exists(original))
+        for field, (size, image_format) in (
+            settings.RECIPE_IMAGE_VARIANTS.items()
+        ):
+            with self.subTest(field=field):
+                image = self.open_image(getattr(self.recipe, field))
+                self.assertLessEqual(image.size[0], size[0])
+                self.assertEqual(image.format, image_format or 'PNG')
+        self.assertEqual(self.open_image(self.recipe.image).size, (1600, 800))
+
+    def test_photo_without_variants_is_served_as_is(self):
+        response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        data = response.json()
+        self.assertEqual(
+            set(data['images'].values()), {data['image']}
+        )
+        process_recipe_image(self.recipe.pk)
+        self.clear_caches()
+        data = self.client.get(f'/api/recipes/{self.recipe.pk}/').json()
+        self.assertNotIn(data['image'], data['images'].values())
+
+    def test_admin_photo_change_queues_processing(self):
+        admin = RecipeAdmin(Recipe, site)
+        self.recipe.image_thumbnail = 'old_thumbnail.png'
+        form = mock.Mock(changed_data=['image'])
+        with mock.patch('recipes.admin.run_in_background') as background:
+            admin.save_model(None, self.recipe, form, True)
+        background.assert_called_once_with(
+            process_recipe_image, self.recipe.pk
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_thumbnail, '')
+        form.changed_data = ['name']
+        with mock.patch('recipes.admin.run_in_background') as background:
+            admin.save_model(None, self.recipe, form, True)
+        background.assert_not_called()
+
+    def test_sweep_processes_photos_left_without_variants(self):
+        Recipe.objects.exclude(pk=self.recipe.pk).update(image='')
+        self.assertEqual(list(missing_variants()), [self.recipe])
+        call_command('process_recipe_images', stdout=io.StringIO())
+        self.assertNotIn(self.recipe, missing_variants())
+
+
+class PantrySearchTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipes(
+            1, [self.user], self.ingredients[3:], self.tags[2:]
+        )[0]
+        pantry_index.refresh()
+
+    def search(self, *ingredients, tags=()):
+        query = '&'.join(
+            [f'ingredients={ingredient.pk}' for ingredient in ingredients]
+            + [f'tags={tag.slug}' for tag in tags]
+        )
+        response = self.client.get(f'/api/recipes/pantry/?{query}&limit=5')
+        self.assertEqual(response.status_code, 200)
+        return [
+            (recipe['id'], recipe['coverage'], recipe['missing'])
+            for recipe in response.json()['results']
+        ]
+
+    def version(self):
+        return get_data_version('recipe-ingredients')
+
+    def test_recipes_are_ordered_by_coverage_then_missing(self):
+        first, _, _, fourth, _ = self.ingredients
+        self.assertEqual(
+            self.search(fourth, self.ingredients[4]),
+            [(self.recipe.pk, 1.0, 0)],
+        )
+        found = self.search(first, fourth)
+        self.assertEqual(found[0], (self.recipe.pk, 0.5, 1))
+        self.assertEqual(
+            found[1:], [(recipe.pk, 0.3333, 2)
+                        for recipe in self.recipes[::-1][:4]]
+        )
+        self.assertEqual(self.search(first, tags=self.tags[2:]), [])
+
+    def test_amount_change_keeps_the_index(self):
+        version = self.version()
+        row = RecipeIngredient.objects.get(
+            recipe=self.recipe, ingredient=self.ingredients[3]
+        )
+        with self.in_another_process():
+            row.amount = 50
+            row.save()
+        self.assertEqual(self.version(), version)
+        with self.in_another_process():
+            row.ingredient = self.ingredients[0]
+            row.save()
+        self.assertNotEqual(self.version(), version)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_index_is_rebuilt_after_ingredients_change(self):
+        first = self.ingredients[0]
+        with self.in_another_process():
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=first, amount=1
+            )
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            stale = self.search(first, self.ingredients[3])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(stale[0], (self.recipe.pk, 0.5, 1))
+        self.assertEqual(
+            self.search(first, self.ingredients[3])[0],
+            (self.recipe.pk, 0.6667, 1),
+        )
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, FEED_LENGTH=3)
+class FeedTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        TimelineEntry.objects.rebuild()
+        self.author = self.authors[1]
+
+    def feed(self, user):
+        return list(TimelineEntry.objects.filter(user=user).order_by(
+            '-pub_date', '-recipe'
+        ).values_list('recipe', flat=True))
+
+    def publish(self, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_recipes(1, [author], self.ingredients, [])[0]
+
+    def test_new_recipe_reaches_followers_and_old_ones_drop_out(self):
+        feed = self.feed(self.user)
+        self.assertEqual(len(feed), 3)
+        recipe = self.publish(self.author)
+        self.assertEqual(self.feed(self.user), [recipe.pk] + feed[:2])
+        self.assertEqual(self.feed(self.authors[2]), [])
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.json()['results'][0]['id'], recipe.pk)
+
+    def test_subscribe_backfills_and_unsubscribe_clears(self):
+        reader, author = self.authors[2], self.authors[0]
+        client = APIClient()
+        client.force_authenticate(reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.feed(reader), list(author.recipes.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True)[:3]))
+        response = client.delete(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.feed(reader), [])
+
+    def test_fan_out_walks_followers_in_batches(self):
+        readers = [
+            User.objects.create_user(
+                username=f'reader{number}',
+                email=f'reader{number}@example.com',
+                password='password',
+            )
+            for number in range(5)
+        ]
+        Subscribe.objects.bulk_create(
+            Subscribe(user=reader, author=self.author) for reader in readers
+        )
+        with override_settings(FEED_FANOUT_BATCH=2):
+            recipe = self.publish(self.author)
+        for reader in readers:
+            self.assertEqual(self.feed(reader), [recipe.pk])
+
+
+class RecipeRepresentationTests(ApiTestCase):
+    """Снимок JSON рецепта в том виде, в каком его отдавал
+    ModelSerializer до перехода на строки values()."""
+
+    def expected(self, number):
+        recipe, author = self.recipes[number], self.authors[number % 3]
+        image = 'http://testserver/media/recipe.png'
+        return {
+            'id': recipe.pk,
+            'tags': [
+                {'id': tag.pk, 'name': tag.name, 'color': tag.color,
+                 'slug': tag.slug}
+                for tag in self.tags[:2]
+            ],
+            'author': {
+                'id': author.pk, 'first_name': 'Имя',
+                'last_name': 'Фамилия', 'username': author.username,
+                'email': author.email,
+                'is_subscribed': author == self.authors[1],
+            },
+            'ingredients': [
+                {'id': ingredient.pk, 'name': ingredient.name,
+                 'measurement_unit': 'г', 'amount': position + 1}
+                for position, ingredient in enumerate(self.ingredients[:3])
+            ],
+            'name': recipe.name,
+            'image': image,
+            'images': {'thumbnail': image, 'detail': image, 'webp': image},
+            'text': 'Описание',
+            'cooking_time': 10,
+            'is_favorited': number % 3 == 0,
+            'is_in_shopping_cart': number % 4 == 0,
+        }
+
+    def assert_rendered(self, response, data):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), json.dumps(
+            data, ensure_ascii=False, separators=(',', ':')
+        ))
+
+    def test_detail(self):
+        self.clear_caches()
+        for cached in (False, True):
+            with self.subTest(cached=cached):
+                self.assert_rendered(
+                    self.client.get(f'/api/recipes/{self.recipes[0].pk}/'),
+                    self.expected(0),
+                )
+
+    def test_list(self):
+        self.clear_caches()
+        self.assert_rendered(self.client.get('/api/recipes/?limit=3'), {
+            'count': len(self.recipes),
+            'next': 'http://testserver/api/recipes/?limit=3&page=2',
+            'previous': None,
+            'results': [self.expected(number) for number in (119, 118, 117)],
+        })
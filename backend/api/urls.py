@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
 from . import views
+from .async_views import async_read_urls
 
 router = routers.SimpleRouter()
 
@@ -9,8 +11,12 @@ router.register('tags', views.TagView, basename='tags')
 router.register('ingredients', views.IngredientView, basename='ingredients')
 router.register('recipes', views.RecipeView, basename='recipes')
 router.register('users', views.UserViewSet, basename='users')
+router_urls = router.urls
+if settings.ASYNC_READ_VIEWS:
+    router_urls = async_read_urls(router_urls)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,8 +1,16 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from collections import defaultdict
+from hashlib import md5
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Count, Max, Sum, Value
+from django.http import Http404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                quote_etag)
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
@@ -10,24 +18,50 @@ from rest_framework.response import Response
 from rest_framework.status import HTTP_201_CREATED, HTTP_204_NO_CONTENT
 from rest_framework.viewsets import ModelViewSet
 
-from recipes.models import (Ingredient, RecipeIngredient, Recipe,
-                            Tag, Favorites, ShoppingCart)
+from recipes.batch import add_links, lock_user, remove_links
+from recipes.models import (CartIngredient, Favorites, Ingredient, Recipe,
+                            ShoppingCart, Tag, TimelineEntry)
+from recipes.search import ingredient_index, pantry_index
+from recipes.versions import get_data_version
 from users.models import Subscribe, User
+
+from .cache import VersionedCacheMixin
 from .filters import IngredientsFilter, RecipeFilter
 from .mixins import ListViewSet
-from .serializers import (IngredientSerializer, RecipeSerializer,
-                          RecipeViewSerializer, ShortRecipeSerializer,
-                          SubscribeSerializer, TagSerializer, UserSerializer)
+from .pagination import (FeedPagination, LimitPageNumberPagination,
+                         RecipePagination)
+from .renderers import (ShoppingListCSVRenderer, ShoppingListPDFRenderer,
+                        ShoppingListTextRenderer)
+from .serializers import (BatchSerializer, IngredientSerializer,
+                          RecipeReadSerializer, RecipeSerializer,
+                          ShortRecipeSerializer, SubscribeSerializer,
+                          TagSerializer, UserSerializer)
+
 
+def change_links(request, model):
+    """Пакетно добавляет (POST) или удаляет (DELETE) связи пользователя
+    с рецептами или авторами и возвращает статус для каждого id."""
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    change = add_links if request.method == 'POST' else remove_links
+    outcomes = change(model, request.user, serializer.validated_data['ids'])
+    return Response({'results': [
+        {'id': pk, 'status': status} for pk, status in outcomes.items()
+    ]})
 
-class TagView(ListViewSet):
+
+class TagView(VersionedCacheMixin, ListViewSet):
+    cache_name = 'tags'
+    query_budgets = {'list': 2, 'retrieve': 2}
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (IsAuthenticatedOrReadOnly, )
 
 
-class IngredientView(ListViewSet):
+class IngredientView(VersionedCacheMixin, ListViewSet):
+    cache_name = 'ingredients'
+    query_budgets = {'list': 2, 'retrieve': 2}
     pagination_class = None
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -36,24 +70,74 @@ class IngredientView(ListViewSet):
     ordering_fields = ['name']
     permission_classes = (IsAuthenticatedOrReadOnly, )
 
+    def build_list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientsFilter.search_param)
+        if not name or not settings.INGREDIENT_SEARCH_INDEX:
+            return super().build_list(request, *args, **kwargs)
+        limit = request.query_params.get('limit', '')
+        if limit.isnumeric():
+            limit = int(limit) or None
+        else:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        return Response(ingredient_index.search(name, limit))
+
 
 class RecipeView(ModelViewSet):
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
+    query_budgets = {
+        'list': 8, 'retrieve': 4, 'download_shopping_cart': 3, 'feed': 7,
+        'similar': 5, 'recommended': 6, 'pantry': 6,
+    }
     permission_classes = (IsAuthenticatedOrReadOnly, )
+    read_actions = {
+        'list', 'retrieve', 'feed', 'similar', 'recommended', 'pantry',
+    }
+
+    def get_queryset(self):
+        if self.action in self.read_actions:
+            return Recipe.objects.with_user_flags(self.request.user)
+        return super().get_queryset()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.read_actions:
+            return queryset.read_values()
+        return queryset
 
     def get_serializer_class(self):
-        if self.action in {'list', 'retrieve'}:
-            return RecipeViewSerializer
+        if self.action in self.read_actions:
+            return RecipeReadSerializer
         return RecipeSerializer
 
+    def get_feed_sources(self):
+        """Лента: записи из таблицы лент и рецепты популярных авторов,
+        которые не раскладываются по лентам при публикации."""
+        user = self.request.user
+        return (
+            (
+                TimelineEntry.objects.filter(user=user),
+                ('pub_date', 'recipe_id'),
+            ),
+            (
+                Recipe.objects.filter(author__in=User.objects.filter(
+                    followed__user=user,
+                    followers_count__gt=settings.FEED_FANOUT_LIMIT,
+                ).values('pk')),
+                ('pub_date', 'id'),
+            ),
+        )
+
     def perform_create(self, serializer):
         serializer.is_valid(raise_exception=True)
         serializer.save(author=self.request.user)
 
     @staticmethod
+    @transaction.atomic
     def favorite_shopping_cart(request, pk, model):
+        lock_user(request.user)
         recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
             serializer = ShortRecipeSerializer(recipe, data=request.data)
@@ -81,36 +165,158 @@ class RecipeView(ModelViewSet):
     def shopping_cart(self, request, pk):
         return self.favorite_shopping_cart(request, pk, ShoppingCart)
 
-    @action(detail=False, methods=['GET'])
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite/batch',
+        url_name='favorite-batch',
+    )
+    def favorite_batch(self, request):
+        return change_links(request, Favorites)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/batch',
+        url_name='shopping-cart-batch',
+    )
+    def shopping_cart_batch(self, request):
+        return change_links(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        page = self.paginate_queryset(self.get_queryset().read_values())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_limit(self):
+        limit = self.request.query_params.get('limit', '')
+        return min(
+            int(limit) if limit.isnumeric()
+            else settings.RECOMMENDATION_NEIGHBOURS,
+            settings.RECOMMENDATION_NEIGHBOURS,
+        )
+
+    @action(detail=True, methods=['get'], pagination_class=None)
+    def similar(self, request, pk):
+        if not pk.isnumeric():
+            raise Http404
+        recipes = self.get_queryset().similar_to(pk).read_values()[
+            :self.get_limit()
+        ]
+        if not recipes and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        pagination_class=None,
+    )
+    def recommended(self, request):
+        """Рецепты, похожие на избранное и список покупок пользователя;
+        без истории — самые популярные."""
+        limit = self.get_limit()
+        recipes = self.get_queryset().recommended_for(
+            request.user
+        ).read_values()[:limit]
+        if not recipes:
+            recipes = self.get_queryset().order_by(
+                '-favorites_count', '-id'
+            ).read_values()[:limit]
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        pagination_class=LimitPageNumberPagination,
+    )
+    def pantry(self, request):
+        """Рецепты из имеющихся ингредиентов: сначала те, для которых
+        есть большая доля ингредиентов, затем с меньшим числом
+        недостающих."""
+        ingredients = request.query_params.getlist('ingredients')
+        if not all(pk.isnumeric() for pk in ingredients):
+            raise ValidationError(
+                'ingredients принимает только числовые значения'
+            )
+        found = pantry_index.search(
+            [int(pk) for pk in ingredients],
+            request.query_params.getlist('tags'),
+        )
+        page = self.paginate_queryset(found)
+        recipes = {
+            row['id']: row for row in self.get_queryset().filter(
+                pk__in=[pk for pk, _, _ in page]
+            ).read_values()
+        }
+        page = [item for item in page if item[0] in recipes]
+        data = self.get_serializer(
+            [recipes[pk] for pk, _, _ in page], many=True
+        ).data
+        for item, (_, coverage, missing) in zip(data, page):
+            item['coverage'] = round(coverage, 4)
+            item['missing'] = missing
+        return self.get_paginated_response(data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListPDFRenderer,
+        ],
+    )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__cart_recipes__user=request.user
-        ).order_by('ingredient__name').values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        text = '\n'.join([
-            f'{ingredient["ingredient__name"]} '
-            f'({ingredient["ingredient__measurement_unit"]}) '
-            f'- {ingredient["amount"]}'
-            for ingredient in ingredients
-        ])
-        filename = 'shopping_list.txt'
-        response = HttpResponse(text, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+        renderer = request.accepted_renderer
+        ingredients = CartIngredient.objects.filter(user=request.user)
+        state = ingredients.aggregate(
+            count=Count('id'), total=Sum('amount'), updated=Max('updated')
+        )
+        names_version = get_data_version(IngredientView.cache_name)
+        etag = quote_etag(md5(
+            f'{renderer.format}:{state["count"]}:{state["total"]}:'
+            f'{state["updated"]}:{names_version}'.encode()
+        ).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = renderer.response(ingredients.order_by(
+                'ingredient__name'
+            ).values(
+                'ingredient__name', 'ingredient__measurement_unit', 'amount'
+            ).iterator())
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
         return response
 
 
 class UserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = LimitPageNumberPagination
     permission_classes = (IsAuthenticated, )
+    query_budgets = {'subscriptions': 4}
 
     @action(
         detail=True,
         methods=['post', 'delete'],
         permission_classes=[IsAuthenticated],
     )
+    @transaction.atomic
     def subscribe(self, request, id):
+        lock_user(request.user)
         author = get_object_or_404(User, pk=id)
         if request.method == 'POST':
             serializer = SubscribeSerializer(
@@ -125,13 +331,36 @@ class UserViewSet(UserViewSet):
         ).delete()
         return Response(status=HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='subscribe/batch',
+        url_name='subscribe-batch',
+    )
+    def subscribe_batch(self, request):
+        return change_links(request, Subscribe)
+
     @action(
         detail=False, methods=['get'], permission_classes=[IsAuthenticated]
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(followed__user=request.user)
+        limit = request.query_params.get('recipes_limit')
+        if limit and not limit.isnumeric():
+            raise ValidationError(
+                'recipes_limit принимает только числовые значения'
+            )
+        queryset = User.objects.filter(followed__user=request.user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        )
         pages = self.paginate_queryset(queryset)
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_for_authors(
+            [author.id for author in pages], int(limit) if limit else None
+        ):
+            recipes[recipe.author_id].append(recipe)
         serializer = SubscribeSerializer(
-            pages, many=True, context={'request': request}
+            pages, many=True,
+            context={'request': request, 'recipes': recipes}
         )
         return self.get_paginated_response(serializer.data)
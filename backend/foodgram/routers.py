@@ -0,0 +1,171 @@
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+PIN_COOKIE = 'db_pin'
+
+routing = ContextVar('routing', default=None)
+
+
+class RoutingState:
+    """Состояние маршрутизации текущего запроса."""
+
+    def __init__(self):
+        self.use_replicas = False
+        self.wrote = False
+        self.replica = None
+
+
+class ReplicaRouter:
+    """Направляет чтение безопасных запросов API на реплики.
+
+    Запись, чтение внутри транзакции и чтение после записи в том же
+    запросе идут в основную базу. Реплика, к которой не удалось
+    подключиться или на которой запрос завершился ошибкой соединения,
+    исключается на REPLICA_RETRY_SECONDS секунд.
+    """
+    down_until = {}
+
+    @staticmethod
+    def replicas():
+        return [alias for alias in connections if alias.startswith(
+            'replica'
+        )]
+
+    @classmethod
+    def mark_down(cls, alias):
+        logger.warning('Replica %s is unavailable', alias)
+        cls.down_until[alias] = (
+            time.monotonic() + settings.REPLICA_RETRY_SECONDS
+        )
+
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or not state.use_replicas or state.wrote:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        now = time.monotonic()
+        replicas = [
+            alias for alias in self.replicas()
+            if self.down_until.get(alias, 0) <= now
+        ]
+        random.shuffle(replicas)
+        for alias in replicas:
+            try:
+                connections[alias].ensure_connection()
+            except OperationalError:
+                self.mark_down(alias)
+                continue
+            state.replica = alias
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def retry_on_primary(error):
+    """Готовит повтор чтения в основной базе после ошибки error.
+
+    Возвращает True, если error — ошибка соединения, а текущий запрос
+    читал с реплики: реплика исключается, и дальше запрос читает
+    из основной базы.
+    """
+    state = routing.get()
+    if (not isinstance(error, OperationalError) or state is None
+            or state.replica is None):
+        return False
+    ReplicaRouter.mark_down(state.replica)
+    state.use_replicas = False
+    state.replica = None
+    return True
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает чтение с реплик для безопасных запросов к api.views.
+
+    После запроса с записью клиент получает подписанную cookie db_pin
+    и REPLICA_PIN_SECONDS секунд читает из основной базы, чтобы видеть
+    свои изменения, пока реплики догоняют основную базу. Cookie не
+    зависит от кеша, поэтому закрепление действует во всех процессах.
+    Представление, у которого чтение с реплики завершилось ошибкой
+    соединения, выполняется ещё раз с чтением из основной базы.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = routing.set(RoutingState())
+        try:
+            return self.pin(self.get_response(request))
+        finally:
+            routing.reset(token)
+
+    async def __acall__(self, request):
+        token = routing.set(RoutingState())
+        try:
+            return self.pin(await self.get_response(request))
+        finally:
+            routing.reset(token)
+
+    @staticmethod
+    def pinned(request):
+        return request.get_signed_cookie(
+            PIN_COOKIE, default=None, salt=PIN_COOKIE,
+            max_age=settings.REPLICA_PIN_SECONDS,
+        ) is not None
+
+    @staticmethod
+    def pin(response):
+        if routing.get().wrote:
+            response.set_signed_cookie(
+                PIN_COOKIE, 'primary', salt=PIN_COOKIE,
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        routing.get().use_replicas = (
+            request.method in SAFE_METHODS
+            and view_class is not None
+            and view_class.__module__ == 'api.views'
+            and not self.pinned(request)
+        )
+
+    def process_exception(self, request, exception):
+        # Асинхронные представления повторяются в api.async_views.call_view.
+        match = request.resolver_match
+        if (match is None or iscoroutinefunction(match.func)
+                or not retry_on_primary(exception)):
+            return None
+        return match.func(request, *match.args, **match.kwargs)
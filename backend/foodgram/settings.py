@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.QueryStatsMiddleware',
+    'foodgram.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,6 +74,46 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: адреса host[:port] через запятую, для SQLite — пути
+# к файлам. В тестах реплики зеркалируют основную базу.
+for number, replica in enumerate(filter(None, (
+    address.strip() for address in os.getenv('DB_REPLICAS', '').split(',')
+)), 1):
+    if 'sqlite' in (DATABASES['default']['ENGINE'] or ''):
+        location = {'NAME': replica}
+    else:
+        host, _, port = replica.partition(':')
+        location = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'], **location, 'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.routers.ReplicaRouter']
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    'recipes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipes',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
+REFERENCE_DATA_CACHE = 'default'
+REFERENCE_DATA_CACHE_TIMEOUT = 60 * 60 * 24
+
+RECIPE_CACHE = os.getenv('RECIPE_CACHE', 'recipes') or None
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME':
@@ -107,11 +149,56 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+QUERY_STATS_HEADERS = os.getenv(
+    'QUERY_STATS_HEADERS', 'False'
+).lower() == 'true'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.stats': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_STATS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+RECIPE_IMAGE_VARIANTS = {
+    'image_thumbnail': ((400, 400), None),
+    'image_detail': ((1200, 1200), None),
+    'image_webp': ((1200, 1200), 'WEBP'),
+}
+
+BACKGROUND_TASK_WORKERS = 2
+BACKGROUND_TASKS_EAGER = False
+
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False').lower() == 'true'
+ASYNC_READ_THREADS = int(os.getenv('ASYNC_READ_THREADS', 16))
+
+FEED_LENGTH = 1000
+FEED_FANOUT_LIMIT = 10000
+FEED_FANOUT_BATCH = 1000
+
+RECOMMENDATION_NEIGHBOURS = 20
+
+BATCH_MAX_IDS = 100
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'rest_framework.filters.SearchFilter',
@@ -122,9 +209,25 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+TOKEN_AUTH_CACHE_SIZE = 10000
+TOKEN_AUTH_CACHE_TTL = int(os.getenv('TOKEN_AUTH_CACHE_TTL', 60))
+TOKEN_AUTH_SHARED_CACHE = os.getenv('TOKEN_AUTH_SHARED_CACHE') or None
+
 DJOSER = {
     'SEND_ACTIVATION_EMAIL': False,
 }
 
 
 AUTH_USER_MODEL = 'users.User'
+
+INGREDIENT_SEARCH_INDEX = os.getenv(
+    'INGREDIENT_SEARCH_INDEX', 'True'
+).lower() == 'true'
+INGREDIENT_SEARCH_LIMIT = None
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
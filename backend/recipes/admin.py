@@ -1,70 +1,140 @@
+import json
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from users.models import Subscribe, User
-from .models import (Favorites, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+from .images import process_recipe_image
+from .models import (CartIngredient, Favorites, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Tag)
+from .tasks import run_in_background
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор без COUNT(*) по большим таблицам.
+
+    В PostgreSQL число строк берётся из оценки планировщика; точный
+    COUNT(*) выполняется, только если оценка меньше
+    ADMIN_EXACT_COUNT_LIMIT. На других СУБД считается точное число.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без точного подсчёта строк таблицы."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
 
 
 class IngredientInline(admin.TabularInline):
     model = RecipeIngredient
+    autocomplete_fields = ('ingredient', )
     extra = 1
     min_num = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
+
 
 class UsersAdmin(UserAdmin):
-    list_filter = ('username', 'email', )
-    list_display = ('pk', 'username', 'email', 'first_name', 'last_name', )
+    list_display = (
+        'pk', 'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'followers_count',
+    )
+    list_filter = ('is_staff', 'is_superuser', 'is_active', 'role', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class RecipeAdmin(LargeTableAdmin):
+    list_display = (
+        'pk', 'author', 'name', 'get_favorites', 'get_in_carts', 'pub_date',
+    )
+    list_select_related = ('author', )
+    search_fields = ('name', 'author__username', 'author__email', )
+    list_filter = ('tags', )
+    autocomplete_fields = ('author', )
+    inlines = (IngredientInline, )
 
+    def save_model(self, request, obj, form, change):
+        if 'image' in form.changed_data:
+            obj.reset_image_variants()
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            run_in_background(process_recipe_image, obj.pk)
 
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'author', 'name', 'get_favorites')
-    search_fields = ('name', 'author', 'tags', )
-    list_filter = ('name', 'author', 'tags', )
-    inlines = (IngredientInline, )
-    empty_value_display = '-пусто-'
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            CartIngredient.objects.rebuild(ShoppingCart.objects.filter(
+                recipe=form.instance
+            ).values_list('user', flat=True))
 
     def get_favorites(self, instance):
-        return instance.fav_recipe.count()
+        return instance.favorites_count
     get_favorites.short_description = 'Избранное'
+    get_favorites.admin_order_field = 'favorites_count'
+
+    def get_in_carts(self, instance):
+        return instance.in_carts_count
+    get_in_carts.short_description = 'В списках покупок'
+    get_in_carts.admin_order_field = 'in_carts_count'
 
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'color', 'slug')
     search_fields = ('name',)
-    list_filter = ('name',)
     empty_value_display = '-пусто-'
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = ('pk', 'name', 'measurement_unit')
     search_fields = ('name',)
-    list_filter = ('name',)
-    empty_value_display = '-пусто-'
 
 
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(LargeTableAdmin):
     list_display = ('pk', 'recipe', 'ingredient')
-    search_fields = ('recipe',)
-    list_filter = ('recipe',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('recipe__author', 'ingredient')
+    search_fields = ('recipe__name', 'ingredient__name')
+    autocomplete_fields = ('recipe', 'ingredient')
 
 
-class SubscribeAdmin(admin.ModelAdmin):
+class SubscribeAdmin(LargeTableAdmin):
     list_display = ('user', 'author')
-    search_fields = ('author',)
-    list_filter = ('author',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
 
 
-class FavoritesAndShoppingCartAdmin(admin.ModelAdmin):
+class FavoritesAndShoppingCartAdmin(LargeTableAdmin):
     list_display = ('pk', 'recipe', 'user')
-    search_fields = ('recipe',)
-    list_filter = ('recipe',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('recipe__author', 'user')
+    search_fields = ('recipe__name', 'user__username')
+    autocomplete_fields = ('recipe', 'user')
 
 
-admin.site.register(User, UserAdmin)
+admin.site.register(User, UsersAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
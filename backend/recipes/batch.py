@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from recipes.counters import count_subquery
+from recipes.feed import backfill_timeline
+from recipes.models import (CartIngredient, Favorites, Recipe, ShoppingCart,
+                            TimelineEntry)
+from recipes.tasks import run_in_background
+from users.models import Subscribe, User
+
+LINKS = {
+    Favorites: ('recipe', Recipe, 'favorites_count'),
+    ShoppingCart: ('recipe', Recipe, 'in_carts_count'),
+    Subscribe: ('author', User, 'followers_count'),
+}
+
+handled_in_batch = ContextVar('handled_in_batch', default=False)
+
+
+@contextmanager
+def batch_signals():
+    """Внутри блока обработчики удаления связей ничего не делают:
+    счётчики, суммы списка покупок и ленты обновляет пакетная функция."""
+    token = handled_in_batch.set(True)
+    try:
+        yield
+    finally:
+        handled_in_batch.reset(token)
+
+
+def lock_user(user):
+    """Блокирует строку пользователя до конца транзакции, чтобы
+    одиночные и пакетные изменения его связей шли по очереди."""
+    list(User.objects.select_for_update().filter(pk=user.pk).values('pk'))
+
+
+def link_states(model, user, ids):
+    """Одним запросом: какие из ids существуют и связаны ли с user."""
+    relation, target, _ = LINKS[model]
+    return dict(target.objects.filter(pk__in=ids).annotate(
+        linked=Exists(model.objects.filter(
+            user=user, **{relation: OuterRef('pk')}
+        ))
+    ).values_list('pk', 'linked'))
+
+
+def recount(model, ids):
+    relation, target, field = LINKS[model]
+    target.objects.filter(pk__in=ids).update(
+        **{field: count_subquery(model, relation)}
+    )
+
+
+@transaction.atomic
+def add_links(model, user, ids):
+    """Добавляет связи user с объектами ids одним INSERT.
+
+    bulk_create не отправляет сигналы, поэтому счётчики, суммы списка
+    покупок и ленты обновляются здесь. Строка пользователя блокируется,
+    поэтому статусы, прочитанные после блокировки, не меняются до конца
+    транзакции, и суммы меняются только для вставленных строк. Связь,
+    созданная в обход lock_user, пропускается ignore_conflicts.
+    Возвращает статус для каждого id.
+    """
+    relation, _, _ = LINKS[model]
+    lock_user(user)
+    ids = list(dict.fromkeys(ids))
+    states = link_states(model, user, ids)
+    outcomes = {}
+    for pk in ids:
+        if pk not in states:
+            outcomes[pk] = 'not_found'
+        elif model is Subscribe and pk == user.pk:
+            outcomes[pk] = 'self'
+        else:
+            outcomes[pk] = 'exists' if states[pk] else 'added'
+    added = [pk for pk, outcome in outcomes.items() if outcome == 'added']
+    if not added:
+        return outcomes
+    model.objects.bulk_create(
+        [model(user=user, **{f'{relation}_id': pk}) for pk in added],
+        ignore_conflicts=True,
+    )
+    recount(model, added)
+    if model is ShoppingCart:
+        CartIngredient.objects.add_recipes(user.pk, added)
+    elif model is Subscribe:
+        run_in_background(backfill_timeline, user.pk, *added)
+    return outcomes
+
+
+@transaction.atomic
+def remove_links(model, user, ids):
+    """Удаляет связи user с объектами ids одним DELETE.
+
+    Обработчики сигналов удаления отключены, их работа выполняется
+    здесь один раз для всего пакета. Возвращает статус для каждого id.
+    """
+    relation, _, _ = LINKS[model]
+    lock_user(user)
+    ids = list(dict.fromkeys(ids))
+    states = link_states(model, user, ids)
+    outcomes = {
+        pk: 'not_found' if pk not in states
+        else 'removed' if states[pk] else 'absent'
+        for pk in ids
+    }
+    removed = [pk for pk, outcome in outcomes.items() if outcome == 'removed']
+    if not removed:
+        return outcomes
+    if model is ShoppingCart:
+        CartIngredient.objects.remove_recipes(user.pk, removed)
+    with batch_signals():
+        model.objects.filter(
+            user=user, **{f'{relation}__in': removed}
+        ).delete()
+    recount(model, removed)
+    if model is Subscribe:
+        TimelineEntry.objects.filter(user=user, author__in=removed).delete()
+    return outcomes
@@ -0,0 +1,48 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorites, Recipe, ShoppingCart
+from users.models import Subscribe, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorites, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счётчик на delta, не опуская его ниже нуля."""
+    if pk is None:
+        return
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    rows.update(**{field: F(field) + delta})
+
+
+def count_subquery(source, relation):
+    return Coalesce(Subquery(
+        source.objects.filter(**{relation: OuterRef('pk')}).order_by(
+        ).values(relation).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def reconcile_counters(check=False):
+    """Сверяет счётчики с реальным числом строк и исправляет расхождения.
+
+    Возвращает число расходящихся строк для каждого счётчика.
+    """
+    drift = {}
+    for model, field, source, relation in COUNTERS:
+        drifted = model.objects.annotate(
+            actual=count_subquery(source, relation)
+        ).exclude(**{field: F('actual')}).values('pk')
+        drift[f'{model._meta.model_name}.{field}'] = (
+            drifted.count() if check else model.objects.filter(
+                pk__in=list(drifted.values_list('pk', flat=True))
+            ).update(**{field: count_subquery(source, relation)})
+        )
+    return drift
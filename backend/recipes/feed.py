@@ -0,0 +1,40 @@
+from itertools import islice
+
+from django.conf import settings
+
+from recipes.models import Recipe, TimelineEntry
+from users.models import Subscribe
+
+
+def fan_out_recipe(recipe_id):
+    """Добавляет новый рецепт в ленты подписчиков автора.
+
+    Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    не раскладываются по лентам, а подмешиваются при чтении ленты.
+    """
+    recipe = Recipe.objects.filter(
+        pk=recipe_id,
+        author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).values('id', 'author', 'pub_date').first()
+    if recipe is None:
+        return
+    followers = Subscribe.objects.filter(
+        author=recipe['author']
+    ).values_list('user', flat=True).iterator(
+        chunk_size=settings.FEED_FANOUT_BATCH
+    )
+    while True:
+        batch = list(islice(followers, settings.FEED_FANOUT_BATCH))
+        if not batch:
+            return
+        TimelineEntry.objects.add((recipe, ), batch)
+
+
+def backfill_timeline(user_id, *author_ids):
+    """Добавляет в ленту последние рецепты авторов после подписки."""
+    TimelineEntry.objects.add(Recipe.objects.filter(
+        author__in=author_ids,
+        author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).order_by('-pub_date', '-id').values(
+        'id', 'author', 'pub_date'
+    )[:settings.FEED_LENGTH], (user_id, ))
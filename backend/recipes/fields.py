@@ -0,0 +1,42 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+
+
+class SearchVectorField(models.Field):
+    """Колонка tsvector для полнотекстового поиска в PostgreSQL.
+
+    На других СУБД колонка текстовая и не заполняется, поиск там
+    выполняется без индекса.
+    """
+    description = 'Full-text search vector'
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'tsvector'
+        return 'text'
+
+
+class SearchVectorIndex(GinIndex):
+    """GIN-индекс по SearchVectorField.
+
+    На других СУБД создаётся обычный индекс: колонка там не заполняется,
+    и индекс нужен только для того, чтобы схема совпадала с моделью.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(model, schema_editor, **kwargs)
+        return models.Index.create_sql(
+            self, model, schema_editor, using=using, **kwargs
+        )
+
+
+@SearchVectorField.register_lookup
+class Matches(models.Lookup):
+    """Совпадение tsvector с tsquery: search_vector__matches=SearchQuery()."""
+    lookup_name = 'matches'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} @@ {rhs}', (*lhs_params, *rhs_params)
@@ -0,0 +1,77 @@
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+
+def encode_image(image, image_format):
+    if image_format in ('JPEG', 'WEBP') and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, optimize=True)
+    return buffer.getvalue()
+
+
+def missing_variants():
+    """Рецепты с фото, у которых нет хотя бы одной уменьшенной копии."""
+    condition = Q()
+    for field in settings.RECIPE_IMAGE_VARIANTS:
+        condition |= Q(**{field: ''})
+    return Recipe.objects.exclude(image='').filter(condition)
+
+
+def process_recipe_image(recipe_id):
+    """Проверяет фото рецепта, удаляет метаданные и готовит уменьшенные
+    копии для списков и страницы рецепта.
+
+    Очищенное фото сохраняется под новым именем, и исходный файл
+    удаляется только после того, как рецепт начал ссылаться на новый,
+    поэтому фото доступно всё время обработки.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    name = recipe.image.name
+    storage = recipe.image.storage
+    try:
+        with storage.open(name, 'rb') as file:
+            content = file.read()
+        Image.open(io.BytesIO(content)).verify()
+        image = Image.open(io.BytesIO(content))
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        logger.warning('Recipe %s has an invalid image %s', recipe_id, name)
+        return
+    if image_format not in ('JPEG', 'PNG', 'WEBP'):
+        image_format = 'PNG'
+    original = name
+    name = storage.save(name, ContentFile(encode_image(image, image_format)))
+    stem, extension = os.path.splitext(name)
+    variants = {}
+    sizes = settings.RECIPE_IMAGE_VARIANTS
+    for field, (size, variant_format) in sizes.items():
+        variant = image.copy()
+        variant.thumbnail(size)
+        variant_format = variant_format or image_format
+        variants[field] = storage.save(
+            f'{stem}_{field}.{variant_format.lower()}',
+            ContentFile(encode_image(variant, variant_format)),
+        )
+    if not Recipe.objects.filter(
+            pk=recipe_id, image=original).update(
+                image=name, updated=timezone.now(), **variants):
+        for variant_name in (name, *variants.values()):
+            storage.delete(variant_name)
+        return
+    storage.delete(original)
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.recommendations import refresh_similarities
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute similar recipes from favorites and shopping carts and '
+        'store the top neighbours of every recipe'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours', type=int,
+            default=settings.RECOMMENDATION_NEIGHBOURS,
+            help='Similar recipes stored per recipe',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Recipes per similarity block and per write transaction',
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rewrite all stored neighbours instead of changed ones',
+        )
+
+    def handle(self, *args, **options):
+        updated, unchanged, removed = refresh_similarities(
+            options['neighbours'], options['batch_size'], options['full']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Neighbours updated for {updated} recipes, {unchanged} '
+            f'unchanged, {removed} removed'
+        ))
@@ -0,0 +1,198 @@
+import random
+from datetime import timedelta
+from functools import partial
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from recipes.counters import reconcile_counters
+from recipes.models import (CartIngredient, Favorites, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag,
+                            TimelineEntry)
+from recipes.recommendations import refresh_similarities
+from recipes.versions import bump_data_version
+from users.models import Subscribe, User
+
+
+class WeightedChoice:
+    """Выбор элементов с весами, убывающими по степенному закону."""
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        self.rng = rng
+        self.weights = list(accumulate(
+            1 / (rank ** exponent) for rank in range(1, len(self.items) + 1)
+        ))
+
+    def sample(self, count):
+        """Не больше count различных элементов: выборка с возвращением,
+        повторы отбрасываются."""
+        if not count:
+            return set()
+        return set(self.rng.choices(
+            self.items, cum_weights=self.weights, k=count
+        ))
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, recipes and interactions'
+    batch_size = 2000
+    update_batch_size = 500
+    words = (
+        'курица', 'говядина', 'рыба', 'сыр', 'томаты', 'картофель', 'рис',
+        'паста', 'грибы', 'чеснок', 'лук', 'сливки', 'запечь', 'обжарить',
+        'отварить', 'нарезать', 'смешать', 'посолить', 'подавать', 'горячим',
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Mean number of favorites per user',
+        )
+        parser.add_argument(
+            '--cart', type=float, default=5,
+            help='Mean number of shopping cart recipes per user',
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Mean number of followed authors per user',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        if not ingredients or not tags:
+            raise CommandError(
+                'Load ingredients and tags first (manage.py load_data)'
+            )
+        rng.shuffle(ingredients)
+        with transaction.atomic():
+            users = self.create_users(options['users'], rng)
+            recipes = self.create_recipes(
+                options['recipes'], users, ingredients, tags, rng
+            )
+            popular = WeightedChoice(recipes, 1.1, rng)
+            authors = WeightedChoice(
+                sorted(set(recipes.values()), key=lambda pk: rng.random()),
+                1.2, rng,
+            )
+            self.create_links(
+                Favorites, users, popular, options['favorites'], rng
+            )
+            self.create_links(
+                ShoppingCart, users, popular, options['cart'], rng
+            )
+            self.create_subscriptions(
+                users, authors, options['subscriptions'], rng
+            )
+            CartIngredient.objects.rebuild(users)
+            reconcile_counters()
+            TimelineEntry.objects.rebuild(users)
+            transaction.on_commit(
+                partial(bump_data_version, 'recipe-ingredients')
+            )
+        refresh_similarities(settings.RECOMMENDATION_NEIGHBOURS, 1000)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(users)} users and {len(recipes)} recipes'
+        ))
+
+    def bulk_create(self, model, objects):
+        for start in range(0, len(objects), self.batch_size):
+            model.objects.bulk_create(
+                objects[start:start + self.batch_size],
+                ignore_conflicts=True,
+            )
+
+    def create_users(self, count, rng):
+        password = make_password('password')
+        prefix = f'synthetic{rng.randrange(10 ** 8)}'
+        self.bulk_create(User, [
+            User(
+                username=f'{prefix}_{number}',
+                email=f'{prefix}_{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(count)
+        ])
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).values_list('pk', flat=True))
+
+    def create_recipes(self, count, users, ingredients, tags, rng):
+        authors = WeightedChoice(users, 1.0, rng)
+        prefix = f'Рецепт {rng.randrange(10 ** 8)}'
+        self.bulk_create(Recipe, [
+            Recipe(
+                author_id=authors.sample(1).pop(),
+                name=' '.join(
+                    (prefix, str(number), *rng.sample(self.words, 2))
+                ),
+                image='temp.png',
+                text=' '.join(rng.choices(self.words, k=rng.randint(5, 60))),
+                cooking_time=rng.randint(5, 180),
+            )
+            for number in range(count)
+        ])
+        recipes = dict(Recipe.objects.filter(
+            name__startswith=f'{prefix} '
+        ).values_list('pk', 'author'))
+        now = timezone.now()
+        pks = list(recipes)
+        for start in range(0, len(pks), self.update_batch_size):
+            batch = pks[start:start + self.update_batch_size]
+            Recipe.objects.filter(pk__in=batch).update(pub_date=Case(
+                *(
+                    When(pk=pk, then=Value(
+                        now - timedelta(minutes=rng.randrange(525600))
+                    ))
+                    for pk in batch
+                ),
+                output_field=DateTimeField(),
+            ))
+        Recipe.objects.filter(pk__in=pks).update_search_vector()
+        popular = WeightedChoice(ingredients, 0.8, rng)
+        recipe_tags = Recipe.tags.through
+        self.bulk_create(RecipeIngredient, [
+            RecipeIngredient(
+                recipe_id=pk, ingredient_id=ingredient,
+                amount=rng.randint(1, 500),
+            )
+            for pk in pks
+            for ingredient in popular.sample(rng.randint(3, 15))
+        ])
+        self.bulk_create(recipe_tags, [
+            recipe_tags(recipe_id=pk, tag_id=tag)
+            for pk in pks
+            for tag in rng.sample(tags, rng.randint(1, len(tags)))
+        ])
+        return recipes
+
+    def create_links(self, model, users, recipes, mean, rng):
+        self.bulk_create(model, [
+            model(user_id=user, recipe_id=recipe)
+            for user in users
+            for recipe in recipes.sample(self.pareto(mean, rng))
+        ])
+
+    def create_subscriptions(self, users, authors, mean, rng):
+        self.bulk_create(Subscribe, [
+            Subscribe(user_id=user, author_id=author)
+            for user in users
+            for author in authors.sample(self.pareto(mean, rng))
+            if author != user
+        ])
+
+    @staticmethod
+    def pareto(mean, rng, alpha=1.5):
+        return int(rng.paretovariate(alpha) * mean * (alpha - 1) / alpha)
@@ -1,17 +1,165 @@
+import csv
 import json
+import os
+import re
+import time
+from functools import partial
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
-from django.core.management.base import BaseCommand
 from recipes.models import Ingredient
+from recipes.versions import bump_data_version
+
+WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json(file, chunk_size=64 * 1024):
+    """Читает JSON-массив объектов по одному элементу.
+
+    Разобранная часть буфера отбрасывается один раз на каждое чтение
+    файла, а не после каждого элемента.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON file must contain an array of objects')
+    position = 1
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if buffer.startswith(',', position):
+            position = WHITESPACE.match(buffer, position + 1).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError('JSON file is truncated or malformed')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+class CSVStream:
+    """Файловый объект, который отдаёт строки как CSV для COPY."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += '"{}","{}"\n'.format(
+                *(value.replace('"', '""') for value in row)
+            )
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
 
 
 class Command(BaseCommand):
-    help = 'Load data from a JSON file'
+    """Загружает ингредиенты, которых ещё нет в базе.
+
+    Загрузка только добавляет строки: пара (название, единица измерения)
+    — это и есть ключ ингредиента, других полей у него нет, поэтому уже
+    существующие строки пропускаются (ON CONFLICT DO NOTHING).
+    """
+    help = 'Insert new ingredients from a JSON or CSV file'
+    readers = {'.json': iter_json, '.csv': iter_csv}
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='data/ingredients.json',
+            help='Path to a JSON or CSV file with ingredients',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Rows per INSERT statement',
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Do not use COPY on PostgreSQL',
+        )
 
     def handle(self, *args, **options):
-        filename = 'data/ingredients.json'
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            for item in data:
-                my_model = Ingredient(**item)
-                my_model.save()
-        self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+        reader = self.readers.get(
+            os.path.splitext(options['path'])[1].lower()
+        )
+        if reader is None:
+            raise CommandError('Only .json and .csv files are supported')
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        started = time.perf_counter()
+        before = Ingredient.objects.count()
+        with open(options['path'], encoding='utf-8') as file:
+            rows = reader(file)
+            with transaction.atomic():
+                if use_copy:
+                    read = self.copy(rows)
+                else:
+                    read = self.bulk_insert(rows, options['batch_size'])
+                transaction.on_commit(
+                    partial(bump_data_version, 'ingredients')
+                )
+        elapsed = time.perf_counter() - started
+        created = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Data imported successfully: {read} rows read, '
+            f'{created} created in {elapsed:.2f}s '
+            f'({read / elapsed if elapsed else read:.0f} rows/s)'
+        ))
+
+    @staticmethod
+    def bulk_insert(rows, batch_size):
+        read = 0
+        while True:
+            batch = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, batch_size)
+            ]
+            if not batch:
+                return read
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            read += len(batch)
+
+    @staticmethod
+    def copy(rows):
+        table = Ingredient._meta.db_table
+        counter = {'read': 0}
+
+        def counted():
+            for row in rows:
+                counter['read'] += 1
+                yield row
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_load '
+                '(name varchar(100), measurement_unit varchar(10)) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_load (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                CSVStream(counted()),
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT DISTINCT name, measurement_unit '
+                f'FROM ingredient_load '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+        return counter['read']
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import missing_variants, process_recipe_image
+
+
+class Command(BaseCommand):
+    help = (
+        'Process recipe photos that have no resized variants, for example '
+        'when a background task was lost on a worker restart'
+    )
+
+    def handle(self, *args, **options):
+        recipe_ids = list(missing_variants().values_list('pk', flat=True))
+        for recipe_id in recipe_ids:
+            process_recipe_image(recipe_id)
+        left = missing_variants().count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Photos processed for {len(recipe_ids)} recipes, {left} still '
+            f'without variants'
+        ))
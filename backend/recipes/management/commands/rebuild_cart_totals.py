@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import CartIngredient
+
+
+class Command(BaseCommand):
+    help = 'Rebuild shopping cart ingredient totals from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report totals that drifted, do not rebuild them',
+        )
+
+    def handle(self, *args, **options):
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in CartIngredient.objects.values_list(
+                'user', 'ingredient', 'amount'
+            ).iterator()
+        }
+        drift = 0
+        for row in CartIngredient.objects.expected().iterator():
+            key = (row['recipe__cart_recipes__user'], row['ingredient'])
+            if stored.pop(key, None) != row['total']:
+                drift += 1
+        drift += len(stored)
+        self.stdout.write(f'Drifted totals: {drift}')
+        if options['check'] or not drift:
+            return
+        with transaction.atomic():
+            CartIngredient.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS('Cart totals rebuilt'))
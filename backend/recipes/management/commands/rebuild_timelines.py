@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild subscription feed timelines from subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'users', nargs='*', type=int,
+            help='User ids, all users by default',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            TimelineEntry.objects.rebuild(options['users'] or None)
+        self.stdout.write(self.style.SUCCESS('Timelines rebuilt'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recalculate denormalized recipe and user counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report counters that drifted, do not fix them',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = reconcile_counters(check=options['check'])
+        for name, rows in drift.items():
+            self.stdout.write(f'{name}: {rows} drifted')
+        if not options['check'] and any(drift.values()):
+            self.stdout.write(self.style.SUCCESS('Counters reconciled'))
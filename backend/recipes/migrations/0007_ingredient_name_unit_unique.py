@@ -0,0 +1,53 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+MAX_AMOUNT = 32766
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    CartIngredient = apps.get_model('recipes', 'CartIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(kept=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        extra = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(pk=group['kept'])
+        for row in RecipeIngredient.objects.filter(ingredient__in=extra):
+            kept = RecipeIngredient.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=group['kept']
+            ).first()
+            if kept is None:
+                row.ingredient_id = group['kept']
+                row.save()
+                continue
+            kept.amount = min(kept.amount + row.amount, MAX_AMOUNT)
+            kept.save()
+            row.delete()
+        for row in CartIngredient.objects.filter(ingredient__in=extra):
+            kept, _ = CartIngredient.objects.get_or_create(
+                user_id=row.user_id, ingredient_id=group['kept']
+            )
+            kept.amount += row.amount
+            kept.save()
+            row.delete()
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='ingredient_name_unit_unique'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.18 on 2026-10-18 05:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'Favorites', 'recipe'),
+    ('recipes', 'Recipe', 'in_carts_count', 'recipes', 'ShoppingCart',
+     'recipe'),
+    ('users', 'User', 'recipes_count', 'recipes', 'Recipe', 'author'),
+    ('users', 'User', 'followers_count', 'users', 'Subscribe', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, name, field, source_app, source_name, relation in COUNTERS:
+        source = apps.get_model(source_app, source_name)
+        apps.get_model(app, name).objects.update(**{field: Coalesce(
+            Subquery(
+                source.objects.filter(**{relation: OuterRef('pk')}).order_by(
+                ).values(relation).annotate(total=Count('pk')).values('total'),
+                output_field=IntegerField(),
+            ),
+            0,
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_ingredient_name_unit_unique'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в список покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
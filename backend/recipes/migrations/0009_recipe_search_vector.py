@@ -0,0 +1,42 @@
+# Generated by Django 3.2.18 on 2026-10-18 05:50
+
+from django.conf import settings
+from django.db import migrations
+
+import recipes.fields
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.search import SearchVector
+    config = settings.RECIPE_SEARCH_CONFIG
+    apps.get_model('recipes', 'Recipe').objects.update(search_vector=(
+        SearchVector('name', weight='A', config=config)
+        + SearchVector('text', weight='B', config=config)
+    ))
+    schema_editor.execute(
+        'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+        'USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=recipes.fields.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.18 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_similarities(apps, schema_editor):
+    RecipeSimilarity = apps.get_model('recipes', 'RecipeSimilarity')
+    duplicates = RecipeSimilarity.objects.values(
+        'recipe', 'similar'
+    ).annotate(kept=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        RecipeSimilarity.objects.filter(
+            recipe=group['recipe'], similar=group['similar']
+        ).exclude(pk=group['kept']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_similarities, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='recipesimilarity',
+            constraint=models.UniqueConstraint(fields=('recipe', 'similar'), name='similarity_recipe_similar_unique'),
+        ),
+    ]
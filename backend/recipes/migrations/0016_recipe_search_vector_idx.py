@@ -0,0 +1,35 @@
+# Generated by Django 3.2.18 on 2026-10-18 07:13
+
+from django.db import migrations
+
+import recipes.fields
+
+
+def drop_raw_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+def create_raw_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+            'USING gin (search_vector)'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipesimilarity_unique'),
+    ]
+
+    operations = [
+        # Индекс из 0009 создан SQL-запросом и отсутствует в состоянии
+        # миграций; он заменяется индексом из Recipe.Meta.indexes.
+        migrations.RunPython(drop_raw_search_index, create_raw_search_index),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=recipes.fields.SearchVectorIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+    ]
@@ -1,8 +1,17 @@
+from itertools import islice
+
+from django.conf import settings
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import (BooleanField, Case, Exists, F, IntegerField,
+                              OuterRef, Q, Sum, Value, When, Window)
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from users.models import Subscribe, User
 
-from users.models import User
+from .fields import SearchVectorField, SearchVectorIndex
 
 
 class Tag(models.Model):
@@ -32,11 +41,158 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit', ),
+                name='ingredient_name_unit_unique',
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для чтения без запросов на каждый рецепт."""
+
+    read_fields = (
+        'id', 'pub_date', 'updated', 'is_favorited', 'is_in_shopping_cart',
+        'author_is_subscribed',
+    )
+    body_fields = (
+        'id', 'name', 'image', 'image_thumbnail', 'image_detail',
+        'image_webp', 'text', 'cooking_time', 'author__id',
+        'author__first_name', 'author__last_name', 'author__username',
+        'author__email',
+    )
+
+    def read_values(self):
+        """Строки страницы для RecipeReadSerializer: id, даты и флаги
+        из with_user_flags; остальные поля сериализатор берёт из кеша
+        или из body_values()."""
+        return self.values(*self.read_fields)
+
+    def body_values(self):
+        """Поля рецептов и авторов, одинаковые для всех пользователей."""
+        return self.values(*self.body_fields)
+
+    def latest_for_authors(self, author_ids, limit=None):
+        recipes = self.filter(author__in=author_ids)
+        if limit is None:
+            return recipes.order_by('author', '-pub_date')
+        ranked = recipes.annotate(position=Window(
+            RowNumber(),
+            partition_by=F('author'),
+            order_by=F('pub_date').desc(),
+        )).order_by().values(
+            'id', 'author', 'name', 'image', 'image_thumbnail',
+            'image_detail', 'image_webp', 'cooking_time', 'position'
+        )
+        sql, params = ranked.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE ranked.position <= %s '
+            f'ORDER BY ranked.author_id, ranked.position',
+            (*params, limit),
+        )
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                author_is_subscribed=Value(
+                    False, output_field=BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorites.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            author_is_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
+    def search(self, query):
+        """Полнотекстовый поиск по названию и описанию с сортировкой
+        по релевантности.
+
+        В PostgreSQL используется колонка search_vector с GIN-индексом,
+        на других СУБД — поиск всех слов запроса через icontains
+        (в SQLite без учёта регистра сравниваются только латинские буквы).
+        """
+        words = query.split()
+        if not words:
+            return self
+        if connections[self.db].vendor == 'postgresql':
+            from django.contrib.postgres.search import SearchQuery, SearchRank
+            query = SearchQuery(
+                query, config=settings.RECIPE_SEARCH_CONFIG,
+                search_type='websearch',
+            )
+            return self.filter(search_vector__matches=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            ).order_by('-search_rank', '-pub_date', '-id')
+        condition = Q()
+        for word in words:
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        return self.filter(condition).annotate(search_rank=sum(
+            Case(
+                When(name__icontains=word, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            for word in words
+        )).order_by('-search_rank', '-pub_date', '-id')
+
+    def similar_to(self, recipe_id):
+        """Соседи рецепта из RecipeSimilarity по убыванию сходства."""
+        return self.filter(similar_to__recipe=recipe_id).annotate(
+            similarity=F('similar_to__score')
+        ).order_by('-similarity', '-id')
+
+    def recommended_for(self, user):
+        """Соседи рецептов из избранного и списка покупок пользователя,
+        которых у него ещё нет, по сумме сходства."""
+        favorites = Favorites.objects.filter(user=user).values('recipe')
+        cart = ShoppingCart.objects.filter(user=user).values('recipe')
+        return self.filter(
+            Q(similar_to__recipe__in=favorites)
+            | Q(similar_to__recipe__in=cart)
+        ).exclude(pk__in=favorites).exclude(pk__in=cart).annotate(
+            similarity=Sum('similar_to__score')
+        ).order_by('-similarity', '-id')
+
+    def touch(self):
+        """Отмечает рецепты изменёнными, чтобы их представления
+        в RECIPE_CACHE перестали использоваться."""
+        return self.update(updated=timezone.now())
+
+    def update_search_vector(self):
+        """Пересчитывает search_vector; вне PostgreSQL ничего не делает."""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        return self.update(
+            search_vector=weighted_search_vector('name', 'text')
+        )
+
+
+def weighted_search_vector(name, text):
+    """Взвешенный tsvector: совпадения в названии важнее, чем в описании.
+
+    Принимает имена колонок или выражения; только для PostgreSQL.
+    """
+    from django.contrib.postgres.search import SearchVector
+    config = settings.RECIPE_SEARCH_CONFIG
+    return (
+        SearchVector(name, weight='A', config=config)
+        + SearchVector(text, weight='B', config=config)
+    )
+
+
 class Recipe(models.Model):
     """Модель создания рецептов пользователями."""
     author = models.ForeignKey(
@@ -48,6 +204,16 @@ class Recipe(models.Model):
     )
     name = models.CharField('Название блюда', max_length=200)
     image = models.ImageField('Фотография блюда', upload_to='')
+    image_thumbnail = models.ImageField(
+        'Миниатюра фотографии', upload_to='', blank=True, editable=False
+    )
+    image_detail = models.ImageField(
+        'Фотография для страницы рецепта', upload_to='', blank=True,
+        editable=False
+    )
+    image_webp = models.ImageField(
+        'Фотография в формате WebP', upload_to='', blank=True, editable=False
+    )
     text = models.CharField('Описание рецепта', max_length=2000)
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -59,6 +225,7 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True,
     )
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     cooking_time = models.PositiveSmallIntegerField(
         'Время приготовления',
         validators=[MinValueValidator(
@@ -68,14 +235,67 @@ class Recipe(models.Model):
         ]
     )
 
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок', default=0, editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор', null=True, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+            SearchVectorIndex(
+                fields=('search_vector', ), name='recipe_search_vector_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}. Автор: {self.author.username}'
 
+    def save(self, *args, **kwargs):
+        """Пересчитывает search_vector в том же INSERT или UPDATE,
+        если сохраняются название или описание."""
+        update_fields = kwargs.get('update_fields')
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        refresh_vector = connections[using].vendor == 'postgresql' and (
+            update_fields is None or {'name', 'text'} & set(update_fields)
+        )
+        if refresh_vector:
+            self.search_vector = weighted_search_vector(
+                Value(self.name), Value(self.text)
+            )
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_vector'}
+        super().save(*args, **kwargs)
+        if refresh_vector:
+            # В атрибуте осталось выражение: значение загрузится из базы
+            # при первом обращении.
+            del self.search_vector
+
+    def reset_image_variants(self):
+        self.image_thumbnail = self.image_detail = self.image_webp = ''
+
 
 class RecipeIngredient(models.Model):
     """Связанная модель для добавления ингредиентов в рецепты."""
@@ -118,6 +338,11 @@ class Favorites(models.Model):
                 name='recipe_user_unique',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('user', 'recipe'), name='favorites_user_recipe_idx'
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.user} -> {self.recipe}'
@@ -147,3 +372,264 @@ class ShoppingCart(models.Model):
                 name='recipe_user_cart_unique',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('user', 'recipe'), name='cart_user_recipe_idx'
+            ),
+        )
+
+
+class CartIngredientQuerySet(models.QuerySet):
+    """Инкрементальное обновление сумм ингредиентов в списках покупок."""
+
+    def apply(self, user_ids, amounts):
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not amounts:
+            return
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        self.bulk_create(
+            [
+                CartIngredient(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids for ingredient_id in amounts
+            ],
+            ignore_conflicts=True,
+        )
+        rows = self.filter(user__in=user_ids, ingredient__in=amounts)
+        rows.update(amount=F('amount') + Case(
+            *(
+                When(ingredient_id=ingredient_id, then=Value(amount))
+                for ingredient_id, amount in amounts.items()
+            ),
+            default=Value(0),
+            output_field=IntegerField(),
+        ), updated=timezone.now())
+        rows.filter(amount__lte=0).delete()
+
+    def add_recipes(self, user_id, recipe_ids, sign=1):
+        self.apply((user_id, ), {
+            row['ingredient']: sign * row['total']
+            for row in RecipeIngredient.objects.filter(
+                recipe__in=recipe_ids
+            ).values('ingredient').annotate(total=Sum('amount'))
+        })
+
+    def remove_recipes(self, user_id, recipe_ids):
+        self.add_recipes(user_id, recipe_ids, sign=-1)
+
+    def expected(self, user_ids=None):
+        lookup = (
+            {'recipe__cart_recipes__isnull': False} if user_ids is None
+            else {'recipe__cart_recipes__user__in': user_ids}
+        )
+        return RecipeIngredient.objects.filter(**lookup).values(
+            'recipe__cart_recipes__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+
+    def rebuild(self, user_ids=None, batch_size=1000):
+        rows = self.all()
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            rows = rows.filter(user__in=user_ids)
+        rows.delete()
+        totals = self.expected(user_ids).iterator()
+        while True:
+            batch = [
+                CartIngredient(
+                    user_id=row['recipe__cart_recipes__user'],
+                    ingredient_id=row['ingredient'],
+                    amount=row['total'],
+                )
+                for row in islice(totals, batch_size)
+            ]
+            if not batch:
+                break
+            self.bulk_create(batch)
+
+
+class CartIngredient(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='cart_ingredients',
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+    )
+    amount = models.IntegerField('Количество', default=0)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = CartIngredientQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient', ),
+                name='user_ingredient_cart_unique',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.amount} {self.ingredient}'
+
+
+class TimelineEntryQuerySet(models.QuerySet):
+    """Ленты подписок: рецепты авторов раскладываются подписчикам при
+    публикации, каждая лента ограничена FEED_LENGTH записями."""
+
+    def add(self, recipes, user_ids):
+        user_ids = list(user_ids)
+        self.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id, recipe_id=recipe['id'],
+                    author_id=recipe['author'], pub_date=recipe['pub_date'],
+                )
+                for user_id in user_ids for recipe in recipes
+            ],
+            ignore_conflicts=True,
+        )
+        self.trim(user_ids)
+
+    def trim(self, user_ids):
+        """Удаляет из лент записи старше FEED_LENGTH последних.
+
+        Граница каждой ленты ищется по индексу timeline_user_pub_date_idx,
+        поэтому для ленты читается не больше FEED_LENGTH + 1 записей.
+        """
+        for user_id in user_ids:
+            entries = self.filter(user=user_id)
+            boundary = list(entries.order_by(
+                '-pub_date', '-recipe'
+            ).values_list('pub_date', 'recipe')[
+                settings.FEED_LENGTH:settings.FEED_LENGTH + 1
+            ])
+            if boundary:
+                pub_date, recipe_id = boundary[0]
+                entries.filter(
+                    Q(pub_date__lt=pub_date)
+                    | Q(pub_date=pub_date, recipe__lte=recipe_id)
+                ).delete()
+
+    def rebuild(self, user_ids=None):
+        """Заново заполняет ленты по подпискам на непопулярных авторов."""
+        users = User.objects.all()
+        if user_ids is not None:
+            users = users.filter(pk__in=list(user_ids))
+        for user_id in users.values_list('pk', flat=True).iterator():
+            self.filter(user=user_id).delete()
+            self.add(Recipe.objects.filter(
+                author__followed__user=user_id,
+                author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+            ).order_by('-pub_date', '-id').values(
+                'id', 'author', 'pub_date'
+            )[:settings.FEED_LENGTH], (user_id, ))
+
+
+class TimelineEntry(models.Model):
+    """Рецепт автора в ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        related_name='timeline',
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    objects = TimelineEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe', ),
+                name='timeline_user_recipe_unique',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe_id}'
+
+
+class RecipeSimilarity(models.Model):
+    """Похожий рецепт из top-K соседей рецепта по совместному
+    добавлению в избранное и список покупок."""
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='neighbours',
+        on_delete=models.CASCADE,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to',
+        on_delete=models.CASCADE,
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar', ),
+                name='similarity_recipe_similar_unique',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'), name='similarity_recipe_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.similar_id}: {self.score:.3f}'
+
+
+class DataVersion(models.Model):
+    """Время последнего изменения набора данных.
+
+    Версии хранятся в базе, а не в кеше, поэтому изменение, сделанное
+    в любом процессе (другой воркер, load_data, shell), сразу видно всем
+    процессам: по версиям они перестраивают индексы в памяти и выбирают
+    ключи кеша, даже если кеш у каждого процесса свой.
+    """
+    name = models.CharField('Набор данных', max_length=64, primary_key=True)
+    version = models.FloatField('Версия')
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
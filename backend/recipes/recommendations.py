@@ -0,0 +1,120 @@
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from recipes.models import Favorites, RecipeSimilarity, ShoppingCart
+
+INTERACTIONS = (
+    (Favorites, 1.0),
+    (ShoppingCart, 0.5),
+)
+
+
+def interaction_matrix():
+    """Разреженная матрица пользователь × рецепт с весами INTERACTIONS.
+
+    Возвращает матрицу и id рецептов, соответствующие её столбцам.
+    """
+    users, recipes, weights = [], [], []
+    for model, weight in INTERACTIONS:
+        pairs = np.fromiter(
+            chain.from_iterable(
+                model.objects.values_list('user', 'recipe').iterator()
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        users.append(pairs[:, 0])
+        recipes.append(pairs[:, 1])
+        weights.append(np.full(len(pairs), weight))
+    user_ids, rows = np.unique(np.concatenate(users), return_inverse=True)
+    recipe_ids, columns = np.unique(
+        np.concatenate(recipes), return_inverse=True
+    )
+    matrix = sparse.csr_matrix(
+        (np.concatenate(weights), (rows, columns)),
+        shape=(len(user_ids), len(recipe_ids)),
+    )
+    return matrix, recipe_ids
+
+
+def top_neighbours(matrix, neighbours, batch_size):
+    """Top-K соседей каждого столбца по косинусному сходству,
+    округлённому до четырёх знаков; при равном сходстве выбираются
+    меньшие номера столбцов, поэтому результат не зависит от порядка
+    строк в базе.
+
+    Матрица сходства считается блоками по batch_size рецептов, поэтому
+    в памяти никогда не бывает больше batch_size её строк.
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)))
+    norms[norms == 0] = 1
+    normalized = sparse.csr_matrix(matrix.multiply(1 / norms))
+    items = normalized.T.tocsr()
+    normalized = normalized.tocsc()
+    for start in range(0, items.shape[0], batch_size):
+        block = (items[start:start + batch_size] @ normalized).tocsr()
+        for offset in range(block.shape[0]):
+            row = start + offset
+            begin, end = block.indptr[offset], block.indptr[offset + 1]
+            columns = block.indices[begin:end]
+            scores = np.round(block.data[begin:end], 4)
+            keep = columns != row
+            columns, scores = columns[keep], scores[keep]
+            top = np.lexsort((columns, -scores))[:neighbours]
+            yield row, columns[top], scores[top]
+
+
+def refresh_similarities(neighbours, batch_size, full=False):
+    """Пересчитывает RecipeSimilarity и перезаписывает только рецепты,
+    у которых изменились соседи.
+
+    Возвращает числа обновлённых, неизменных и удалённых рецептов.
+    """
+    matrix, recipe_ids = interaction_matrix()
+    stale = set(
+        RecipeSimilarity.objects.values_list('recipe', flat=True).distinct()
+    ) - set(recipe_ids.tolist())
+    updated = unchanged = 0
+    batch = []
+
+    def save(batch):
+        stored = {}
+        for recipe_id, similar_id, score in RecipeSimilarity.objects.filter(
+            recipe__in=[recipe_id for recipe_id, _ in batch]
+        ).order_by('recipe', '-score', 'similar_id').values_list(
+            'recipe', 'similar', 'score'
+        ):
+            stored.setdefault(recipe_id, []).append((similar_id, score))
+        changed = {
+            recipe_id: rows for recipe_id, rows in batch
+            if full or stored.get(recipe_id, []) != rows
+        }
+        with transaction.atomic():
+            RecipeSimilarity.objects.filter(recipe__in=list(changed)).delete()
+            RecipeSimilarity.objects.bulk_create(
+                RecipeSimilarity(
+                    recipe_id=recipe_id, similar_id=similar_id, score=score
+                )
+                for recipe_id, rows in changed.items()
+                for similar_id, score in rows
+            )
+        return len(changed), len(batch) - len(changed)
+
+    for row, columns, scores in top_neighbours(
+        matrix, neighbours, batch_size
+    ):
+        batch.append((int(recipe_ids[row]), [
+            (int(recipe_ids[column]), float(score))
+            for column, score in zip(columns, scores)
+        ]))
+        if len(batch) >= batch_size:
+            changed, same = save(batch)
+            updated, unchanged = updated + changed, unchanged + same
+            batch = []
+    if batch:
+        changed, same = save(batch)
+        updated, unchanged = updated + changed, unchanged + same
+    RecipeSimilarity.objects.filter(recipe__in=stale).delete()
+    return updated, unchanged, len(stale)
@@ -0,0 +1,195 @@
+import bisect
+import threading
+from itertools import chain
+
+import numpy as np
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.tasks import run_in_background
+from recipes.versions import get_data_version, get_data_versions
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся отсортированными в нижнем регистре: совпадения
+    по началу названия ищутся бинарным поиском, совпадения внутри
+    названия — поиском подстроки по склеенной строке всех названий.
+    Индекс строится при первом запросе и перестраивается, когда
+    меняется версия данных об ингредиентах.
+    """
+    separator = '\n'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = None
+
+    def search(self, query, limit=None):
+        keys, items, offsets, text = self._load()
+        query = query.strip().lower().replace(self.separator, ' ')
+        found = []
+        index = bisect.bisect_left(keys, query)
+        while (index < len(keys) and keys[index].startswith(query)
+               and (limit is None or len(found) < limit)):
+            found.append(index)
+            index += 1
+        position = text.find(query)
+        while position != -1 and (limit is None or len(found) < limit):
+            index = bisect.bisect_right(offsets, position) - 1
+            if position != offsets[index]:
+                found.append(index)
+            position = text.find(query, offsets[index] + len(keys[index]) + 1)
+        return [items[index] for index in found]
+
+    def _load(self):
+        version = get_data_version('ingredients')
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._data = self._build()
+                    self._version = version
+        return self._data
+
+    def _build(self):
+        rows = sorted(
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit'),
+            key=lambda row: (row[1].lower(), row[0])
+        )
+        keys = [
+            name.lower().replace(self.separator, ' ') for _, name, _ in rows
+        ]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for pk, name, measurement_unit in rows
+        ]
+        offsets = []
+        position = 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + len(self.separator)
+        return keys, items, offsets, self.separator.join(keys)
+
+
+class PantryIndex:
+    """Обратный индекс ингредиент → рецепты в памяти процесса для поиска
+    рецептов по имеющимся продуктам.
+
+    Рецепты пронумерованы по возрастанию id. Для каждого ингредиента
+    хранится отсортированный массив номеров рецептов (все массивы
+    склеены в один, границы — в offsets), для каждого тега — битовая
+    маска рецептов. Когда меняется версия данных о составе рецептов
+    или о тегах, индекс перестраивается в фоне, а запросы до замены
+    обслуживает старый индекс. Ждать построения приходится только
+    запросам, пришедшим раньше первого индекса процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def search(self, ingredient_ids, tags=()):
+        """Рецепты, в которых есть хотя бы один из ингредиентов, в виде
+        (id, доля имеющихся ингредиентов, число недостающих) по убыванию
+        доли, затем по возрастанию числа недостающих и новизне."""
+        recipe_ids, totals, ingredients, offsets, positions, masks = (
+            self._load()
+        )
+        requested = np.unique(np.asarray(ingredient_ids, dtype=np.int64))
+        found = np.searchsorted(ingredients, requested)
+        found = found[found < len(ingredients)]
+        found = found[np.isin(ingredients[found], requested)]
+        matched = np.bincount(
+            np.concatenate([np.empty(0, dtype=positions.dtype)] + [
+                positions[offsets[index]:offsets[index + 1]]
+                for index in found
+            ]),
+            minlength=len(recipe_ids),
+        )
+        candidates = np.flatnonzero(matched)
+        if tags:
+            allowed = np.zeros(len(recipe_ids), dtype=bool)
+            for slug in tags:
+                if slug in masks:
+                    allowed |= masks[slug]
+            candidates = candidates[allowed[candidates]]
+        coverage = matched[candidates] / totals[candidates]
+        missing = totals[candidates] - matched[candidates]
+        order = np.lexsort((-recipe_ids[candidates], missing, -coverage))
+        return [
+            (int(recipe_ids[candidates[index]]), float(coverage[index]),
+             int(missing[index]))
+            for index in order
+        ]
+
+    def _load(self):
+        version = self._current_version()
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self._state = (version, self._build())
+                state = self._state
+        elif state[0] != version and not self._lock.locked():
+            run_in_background(self.refresh)
+        return state[1]
+
+    @staticmethod
+    def _current_version():
+        return get_data_versions('recipe-ingredients', 'tags')
+
+    def refresh(self):
+        """Строит индекс заново и подменяет им текущий одним
+        присваиванием. Ничего не делает, если индекс уже строится."""
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            version = self._current_version()
+            self._state = (version, self._build())
+        finally:
+            self._lock.release()
+
+    def warm_up(self):
+        """Строит первый индекс процесса в фоне."""
+        run_in_background(self.refresh)
+
+    @staticmethod
+    def _pairs(queryset, *fields):
+        return np.fromiter(
+            chain.from_iterable(queryset.values_list(*fields).iterator()),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+
+    def _build(self):
+        pairs = np.unique(
+            self._pairs(RecipeIngredient.objects, 'recipe', 'ingredient'),
+            axis=0,
+        )
+        recipe_ids, recipes, totals = np.unique(
+            pairs[:, 0], return_inverse=True, return_counts=True
+        )
+        by_ingredient = np.lexsort((recipes, pairs[:, 1]))
+        ingredients, starts = np.unique(
+            pairs[by_ingredient, 1], return_index=True
+        )
+        offsets = np.append(starts, len(pairs))
+        positions = recipes[by_ingredient].astype(np.int32)
+        tagged = self._pairs(Recipe.tags.through.objects, 'tag', 'recipe')
+        tagged_positions = np.searchsorted(recipe_ids, tagged[:, 1])
+        indexed = tagged_positions < len(recipe_ids)
+        indexed[indexed] = (
+            recipe_ids[tagged_positions[indexed]] == tagged[indexed, 1]
+        )
+        masks = {}
+        for tag_id, slug in Tag.objects.values_list('id', 'slug'):
+            masks[slug] = np.zeros(len(recipe_ids), dtype=bool)
+            masks[slug][tagged_positions[
+                indexed & (tagged[:, 0] == tag_id)
+            ]] = True
+        return (
+            recipe_ids, totals, ingredients, offsets, positions, masks
+        )
+
+
+ingredient_index = IngredientIndex()
+pantry_index = PantryIndex()
@@ -0,0 +1,153 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from recipes.batch import handled_in_batch
+from recipes.counters import change_counter
+from recipes.feed import backfill_timeline, fan_out_recipe
+from recipes.models import (CartIngredient, Favorites, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag,
+                            TimelineEntry)
+from recipes.tasks import run_in_background
+from recipes.versions import bump_data_version
+from users.models import Subscribe, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    transaction.on_commit(partial(bump_data_version, 'ingredients'))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    transaction.on_commit(partial(bump_data_version, 'tags'))
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_delete, sender=Recipe)
+def bump_recipe_ingredients_version(**kwargs):
+    transaction.on_commit(partial(bump_data_version, 'recipe-ingredients'))
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def bump_changed_recipe_ingredients_version(instance, **kwargs):
+    """Версия меняется, только если у рецепта меняется набор
+    ингредиентов: от количества индекс поиска по продуктам не зависит."""
+    if instance.pk is None or RecipeIngredient.objects.filter(
+        pk=instance.pk
+    ).exclude(ingredient=instance.ingredient_id).exists():
+        bump_recipe_ingredients_version()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_retagged_recipes_version(action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_recipe_ingredients_version()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tagged_recipes(instance, **kwargs):
+    Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredients=instance).touch()
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def touch_ingredient_recipe(instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).touch()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_retagged_recipes(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        recipes = Recipe.objects.filter(tags=instance)
+    else:
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    recipes.touch()
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(instance, created, update_fields, **kwargs):
+    fields = {'first_name', 'last_name', 'username', 'email'}
+    if created or update_fields is not None and not (
+        fields & set(update_fields)
+    ):
+        return
+    Recipe.objects.filter(author=instance).touch()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_cart_totals(instance, created, **kwargs):
+    if created:
+        CartIngredient.objects.add_recipes(
+            instance.user_id, (instance.recipe_id, )
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_cart_totals(instance, **kwargs):
+    if handled_in_batch.get():
+        return
+    CartIngredient.objects.remove_recipes(
+        instance.user_id, (instance.recipe_id, )
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_to_followers(instance, created, **kwargs):
+    if created:
+        run_in_background(fan_out_recipe, instance.pk)
+
+
+@receiver(post_save, sender=Subscribe)
+def add_author_to_timeline(instance, created, **kwargs):
+    if created:
+        run_in_background(
+            backfill_timeline, instance.user_id, instance.author_id
+        )
+
+
+@receiver(post_delete, sender=Subscribe)
+def remove_author_from_timeline(instance, **kwargs):
+    if handled_in_batch.get():
+        return
+    TimelineEntry.objects.filter(
+        user=instance.user_id, author=instance.author_id
+    ).delete()
+
+
+def counter_receivers(sender, model, field, relation):
+    """Подключает обработчики, которые поддерживают счётчик field
+    у объекта model, на который ссылается поле relation модели sender."""
+
+    def created(instance, created, **kwargs):
+        if created:
+            change_counter(
+                model, getattr(instance, f'{relation}_id'), field, 1
+            )
+
+    def deleted(instance, **kwargs):
+        if handled_in_batch.get():
+            return
+        change_counter(model, getattr(instance, f'{relation}_id'), field, -1)
+
+    post_save.connect(created, sender=sender, weak=False)
+    post_delete.connect(deleted, sender=sender, weak=False)
+
+
+counter_receivers(Favorites, Recipe, 'favorites_count', 'recipe')
+counter_receivers(ShoppingCart, Recipe, 'in_carts_count', 'recipe')
+counter_receivers(Recipe, User, 'recipes_count', 'author')
+counter_receivers(Subscribe, User, 'followers_count', 'author')
@@ -0,0 +1,35 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.BACKGROUND_TASK_WORKERS,
+    thread_name_prefix='background-task',
+)
+
+
+def run_task(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+    finally:
+        connections.close_all()
+
+
+def run_in_background(func, *args):
+    """Выполняет func в пуле потоков после фиксации текущей транзакции.
+
+    Очередь пула хранится в памяти процесса, поэтому задача выполняется
+    не больше одного раза: задачи, не успевшие выполниться до остановки
+    процесса, теряются без повтора.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        transaction.on_commit(partial(func, *args))
+    else:
+        transaction.on_commit(partial(executor.submit, run_task, func, *args))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recipes.models import DataVersion
+
+
+def get_cache():
+    return caches[settings.REFERENCE_DATA_CACHE]
+
+
+def get_data_versions(*names):
+    """Версии наборов данных из DataVersion; у набора, который ещё
+    не менялся, версия 0."""
+    versions = dict(
+        DataVersion.objects.filter(name__in=names).values_list(
+            'name', 'version'
+        )
+    )
+    return tuple(versions.get(name, 0.0) for name in names)
+
+
+def get_data_version(name):
+    return get_data_versions(name)[0]
+
+
+def bump_data_version(name):
+    version = time.time()
+    if not DataVersion.objects.filter(name=name).update(version=version):
+        DataVersion.objects.update_or_create(
+            name=name, defaults={'version': version}
+        )
+
+
+def get_recipe_cache():
+    if settings.RECIPE_CACHE is None:
+        return None
+    return caches[settings.RECIPE_CACHE]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.18 on 2026-10-18 05:52
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_subscriptions(apps, schema_editor):
+    Subscribe = apps.get_model('users', 'Subscribe')
+    User = apps.get_model('users', 'User')
+    duplicates = Subscribe.objects.values('user', 'author').annotate(
+        kept=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for group in duplicates:
+        Subscribe.objects.filter(
+            user=group['user'], author=group['author']
+        ).exclude(pk=group['kept']).delete()
+        User.objects.filter(pk=group['author']).update(
+            followers_count=Subscribe.objects.filter(
+                author=group['author']
+            ).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_subscriptions, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='subscribe',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_subscribing'),
+        ),
+    ]
@@ -21,6 +21,12 @@ class User(AbstractUser):
         default=UserRole.USER.value,
         max_length=15,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -70,6 +76,10 @@ class Subscribe(models.Model):
     )
 
     class Meta:
-        UniqueConstraint(name='unique_subscribing', fields=['user', 'author'])
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'author'), name='unique_subscribing'
+            ),
+        )